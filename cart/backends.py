@@ -0,0 +1,161 @@
+"""
+Storage backends for ``cart.cart.Cart``.
+
+A backend only stores lines as ``{product_id (str): {'quantity', 'price'}}``
+with prices as strings; hydrating ``Product`` rows and doing arithmetic is
+the cart's job. Reads never write: an empty cart costs nothing, and the
+session is only touched when a line actually changes.
+
+Select one with ``settings.CART_BACKEND`` (dotted path).
+"""
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CartLine
+
+CART_SESSION_KEY = 'cart'
+CART_ID_SESSION_KEY = 'cart_id'
+
+
+class SessionCartBackend:
+    """The whole cart as JSON inside the session (the original storage)."""
+
+    # Lines come back without Product rows; the cart fetches them on iteration
+    hydrates_products = False
+
+    def __init__(self, request):
+        self.session = request.session
+
+    def lines(self):
+        return {
+            pid: {'quantity': item['quantity'], 'price': item['price']}
+            for pid, item in self.session.get(CART_SESSION_KEY, {}).items()
+        }
+
+    def products(self):
+        return {}
+
+    def _cart(self):
+        return self.session.setdefault(CART_SESSION_KEY, {})
+
+    def add(self, product_id, price, quantity, override_quantity=False):
+        cart = self._cart()
+        pid = str(product_id)
+        if pid in cart:
+            if override_quantity:
+                cart[pid]['quantity'] = quantity
+            else:
+                cart[pid]['quantity'] += quantity
+        else:
+            cart[pid] = {'quantity': quantity, 'price': str(price), 'product_id': pid}
+        self.session.modified = True
+
+    def update(self, changes):
+        """Apply ``{product_id: {'quantity': ..., 'price': ...} or None}`` in one write."""
+        cart = self._cart()
+        for pid, line in changes.items():
+            if line is None:
+                cart.pop(str(pid), None)
+            else:
+                cart[str(pid)] = {'quantity': line['quantity'], 'price': str(line['price']), 'product_id': str(pid)}
+        self.session.modified = True
+
+    def remove(self, product_id):
+        cart = self.session.get(CART_SESSION_KEY, {})
+        if str(product_id) in cart:
+            del cart[str(product_id)]
+            self.session.modified = True
+
+    def clear(self):
+        if self.session.get(CART_SESSION_KEY):
+            self.session[CART_SESSION_KEY] = {}
+
+
+class DatabaseCartBackend:
+    """
+    One ``CartLine`` row per product, updated in place. The session only
+    holds a random cart id, written once when the first line is added.
+    """
+
+    # Lines are loaded with their Product in the same query
+    hydrates_products = True
+
+    def __init__(self, request):
+        self.session = request.session
+        self._rows = None
+
+    @property
+    def cart_key(self):
+        return self.session.get(CART_ID_SESSION_KEY)
+
+    def _ensure_key(self):
+        if not self.cart_key:
+            self.session[CART_ID_SESSION_KEY] = uuid.uuid4().hex
+        return self.cart_key
+
+    def _load(self):
+        if self._rows is None:
+            if not self.cart_key:
+                self._rows = []
+            else:
+                self._rows = list(
+                    CartLine.objects.filter(cart_key=self.cart_key)
+                    .select_related('product').order_by('id')
+                )
+        return self._rows
+
+    def lines(self):
+        return {
+            str(row.product_id): {'quantity': row.quantity, 'price': str(row.price)}
+            for row in self._load()
+        }
+
+    def products(self):
+        return {str(row.product_id): row.product for row in self._load()}
+
+    def add(self, product_id, price, quantity, override_quantity=False):
+        key = self._ensure_key()
+        lines = CartLine.objects.filter(cart_key=key, product_id=product_id)
+        new_quantity = quantity if override_quantity else F('quantity') + quantity
+        # update() skips auto_now; purge_carts goes by updated_at
+        now = timezone.now()
+        if not lines.update(quantity=new_quantity, updated_at=now):
+            try:
+                with transaction.atomic():
+                    CartLine.objects.create(cart_key=key, product_id=product_id, quantity=quantity, price=price)
+            except IntegrityError:
+                # Another request created the line first (double click)
+                lines.update(quantity=new_quantity, updated_at=now)
+        self._rows = None
+
+    def update(self, changes):
+        """Apply ``{product_id: {'quantity': ..., 'price': ...} or None}``."""
+        if not self.cart_key:
+            return
+        lines = CartLine.objects.filter(cart_key=self.cart_key)
+        removed = [pid for pid, line in changes.items() if line is None]
+        if removed:
+            lines.filter(product_id__in=removed).delete()
+        now = timezone.now()
+        changed = [
+            CartLine(id=row.id, quantity=changes[str(row.product_id)]['quantity'],
+                     price=changes[str(row.product_id)]['price'], updated_at=now)
+            for row in self._load()
+            if changes.get(str(row.product_id)) is not None
+        ]
+        if changed:
+            CartLine.objects.bulk_update(changed, ['quantity', 'price', 'updated_at'])
+        self._rows = None
+
+    def remove(self, product_id):
+        if self.cart_key:
+            CartLine.objects.filter(cart_key=self.cart_key, product_id=product_id).delete()
+            self._rows = None
+
+    def clear(self):
+        if self.cart_key:
+            CartLine.objects.filter(cart_key=self.cart_key).delete()
+            self._rows = None
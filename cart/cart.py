@@ -1,74 +1,94 @@
 from decimal import Decimal, InvalidOperation
 from django.conf import settings
+from django.utils.module_loading import import_string
 from products.models import Product
+from .quote import CartQuote, quote_key
 
+DEFAULT_CART_BACKEND = 'cart.backends.DatabaseCartBackend'
+
+
+def get_cart_backend():
+    return import_string(getattr(settings, 'CART_BACKEND', DEFAULT_CART_BACKEND))
 
 
 class Cart:
     def __init__(self, request):
-        self.session = request.session
-        cart = self.session.get('cart')
-        if not cart:
-            cart = self.session['cart'] = {}
-        self.cart = cart
-
-    # Default Indian GST rates if not in settings
-    if not hasattr(settings, 'INDIAN_TAX_RATES'):
-        settings.INDIAN_TAX_RATES = {
-            'GST': {
-                'cgst': Decimal('0.09'),  # 9%
-                'sgst': Decimal('0.09'),  # 9%
-                'igst': Decimal('0.18'),  # 18%
-            }
-        }
+        self.backend = get_cart_backend()(request)
+        self._lines = None
+        self._products = None
+        # Quotes by content hash: recomputed only when lines, prices or slabs change
+        self._quotes = {}
+
+    @property
+    def cart(self):
+        """Raw lines: {product_id: {'quantity': int, 'price': str}}. Read-only."""
+        if self._lines is None:
+            self._lines = self.backend.lines()
+        return self._lines
+
+    def _product_map(self):
+        if self._products is None:
+            if self.backend.hydrates_products:
+                self._products = self.backend.products()
+            else:
+                self._products = {str(p.id): p for p in Product.objects.filter(id__in=self.cart.keys())}
+        return self._products
 
+    def _reset(self):
+        self._lines = None
+        self._products = None
 
     def add(self, product, quantity=1, override_quantity=False):
-            product_id = str(product.id)
-            price_str = str(product.price)  # <-- store string, not Decimal
-            if product_id in self.cart:
-                if override_quantity:
-                    self.cart[product_id]['quantity'] = quantity
-                else:
-                    self.cart[product_id]['quantity'] += quantity
-            else:
-                self.cart[product_id] = {
-                    'quantity': quantity,
-                    'price': price_str,  # saved as string
-                    'product_id': product_id,
-                }
-            self.save()
-
-    def save(self):
-        self.session.modified = True
+        self.backend.add(product.id, product.price, quantity, override_quantity)
+        self._reset()
 
     def remove(self, product):
-        product_id = str(product.id)
-        if product_id in self.cart:
-            del self.cart[product_id]
-            self.save()
+        self.backend.remove(product.id)
+        self._reset()
 
     def clear(self):
-        self.session['cart'] = {}
-        self.save()
+        self.backend.clear()
+        self._reset()
 
     def __iter__(self):
-        product_ids = self.cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-        product_map = {str(p.id): p for p in products}
-        for pid, item in list(self.cart.items()):
-            # convert back to Decimal for arithmetic and attach product object
-            item['product'] = product_map.get(pid)
-            item['price'] = Decimal(item['price'])
-            item['total_price'] = item['price'] * item['quantity']
-            yield item
+        lines = self.cart
+        product_map = self._product_map()
+        for pid, line in lines.items():
+            # Fresh dicts every time: iterating never changes the stored cart
+            price = Decimal(line['price'])
+            yield {
+                'product_id': pid,
+                'product': product_map.get(pid),
+                'quantity': line['quantity'],
+                'price': price,
+                'total_price': price * line['quantity'],
+            }
 
     def __len__(self):
         return sum(item['quantity'] for item in self.cart.values())
 
-    def get_subtotal(self):
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+    def quote(self, state_code=None):
+        """
+        ``CartQuote`` for the current lines; inter-state (IGST) when a
+        ``state_code`` is given, CGST + SGST otherwise. Memoized on the
+        content of the cart, so repeated calls in a request are free.
+        """
+        product_map = self._product_map()
+        lines = [
+            (pid, line['quantity'], line['price'],
+             product_map[pid].gst_rate if pid in product_map else Product.DEFAULT_GST_SLAB)
+            for pid, line in self.cart.items()
+        ]
+        interstate = bool(state_code)
+        key = quote_key(lines, interstate)
+        if key not in self._quotes:
+            self._quotes[key] = CartQuote(
+                ((price, quantity, slab) for _, quantity, price, slab in lines), interstate
+            )
+        return self._quotes[key]
 
+    def get_subtotal(self):
+        return self.quote().subtotal
 
     def get_total_price(self):
         """
@@ -78,49 +98,78 @@ class Cart:
 
     def calculate_taxes(self, state_code=None):
         """
-        Calculate Indian GST taxes with state-specific logic.
-        Returns: dict of tax breakdown.
+        Indian GST breakdown: dict of cgst, sgst, igst and total_tax.
         """
-        subtotal = self.get_subtotal()
-        taxes = {
-            'cgst': Decimal('0'),
-            'sgst': Decimal('0'),
-            'igst': Decimal('0'),
-            'total_tax': Decimal('0')
-        }
-
-        if state_code:  # Inter-state (IGST)
-            taxes['igst'] = subtotal * settings.INDIAN_TAX_RATES['GST']['igst']
-        else:  # Intra-state (CGST + SGST)
-            taxes['cgst'] = subtotal * settings.INDIAN_TAX_RATES['GST']['cgst']
-            taxes['sgst'] = subtotal * settings.INDIAN_TAX_RATES['GST']['sgst']
-
-        taxes['total_tax'] = taxes['igst'] if state_code else (taxes['cgst'] + taxes['sgst'])
-        return taxes
+        return self.quote(state_code).as_dict()['taxes']
 
     def get_grand_total(self, state_code=None):
         """
         Get complete order breakdown including taxes.
         """
-        subtotal = self.get_subtotal()
-        taxes = self.calculate_taxes(state_code)
-        return {
-            'subtotal': subtotal,
-            'taxes': taxes,
-            'grand_total': subtotal + taxes['total_tax']
-        }
+        return self.quote(state_code).as_dict()
 
     def get_product(self, product_id):
         """Get product details from cart"""
         return self.cart.get(str(product_id))
 
     def validate_cart(self):
-        """Validate all cart items are available"""
-        for item_id, item in self.cart.items():
+        """
+        Check every line against the current catalog in a single query:
+        refresh changed prices, drop lines whose product is gone, unavailable
+        or out of stock, and clamp quantities to the stock on hand.
+
+        Returns a list of changes for the checkout page, each a dict with
+        ``product_id``, ``name``, ``reason`` and a human readable ``message``.
+        An empty list means the cart was already valid.
+        """
+        lines = self.cart
+        if not lines:
+            return []
+        if self.backend.hydrates_products:
+            product_map = self.backend.products()
+        else:
+            products = Product.objects.filter(id__in=lines.keys()).only(
+                'id', 'name', 'price', 'stock', 'available'
+            )
+            product_map = {str(p.id): p for p in products}
+
+        changes = {}
+        report = []
+        for item_id, item in lines.items():
+            product = product_map.get(item_id)
+            name = product.name if product else None
             try:
-                product = Product.objects.get(id=item_id)
-                if product.price != Decimal(item['price']):
-                    item['price'] = str(product.price)
-            except (Product.DoesNotExist, InvalidOperation):
-                self.remove(item_id)
-        self.save()
+                price = Decimal(item['price'])
+            except InvalidOperation:
+                price = None
+
+            if product is None or not product.available:
+                changes[item_id] = None
+                report.append(_change(item_id, name, 'unavailable',
+                                      f"{name or 'A product'} is no longer available and was removed."))
+                continue
+            if product.stock <= 0:
+                changes[item_id] = None
+                report.append(_change(item_id, name, 'out_of_stock',
+                                      f"{name} is out of stock and was removed."))
+                continue
+
+            quantity = item['quantity']
+            if quantity > product.stock:
+                report.append(_change(item_id, name, 'quantity_clamped',
+                                      f"Only {product.stock} of {name} left; quantity reduced from {quantity}."))
+                quantity = product.stock
+            if price != product.price:
+                report.append(_change(item_id, name, 'price_changed',
+                                      f"The price of {name} changed to ₹{product.price}."))
+            if quantity != item['quantity'] or price != product.price:
+                changes[item_id] = {'quantity': quantity, 'price': product.price}
+
+        if changes:
+            self.backend.update(changes)
+            self._reset()
+        return report
+
+
+def _change(product_id, name, reason, message):
+    return {'product_id': product_id, 'name': name, 'reason': reason, 'message': message}
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cart.models import CartLine
+
+
+class Command(BaseCommand):
+    help = "Delete database carts none of whose lines have been touched for a while."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help="Remove carts idle for more than this many days.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # Whole carts only: a line left alone in a cart still being edited stays
+        active = CartLine.objects.filter(updated_at__gte=cutoff).values('cart_key')
+        deleted, _ = CartLine.objects.filter(updated_at__lt=cutoff).exclude(cart_key__in=active).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} stale cart lines."))
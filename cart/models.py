@@ -0,0 +1,22 @@
+from django.db import models
+from products.models import Product
+
+
+class CartLine(models.Model):
+    """One product line of a cart stored by ``DatabaseCartBackend``."""
+    cart_key = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.PositiveIntegerField(default=1)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_key', 'product'], name='cart_line_unique_product'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'], name='cart_line_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} ({self.cart_key})"
@@ -0,0 +1,124 @@
+"""
+Cart totals and GST, computed once per cart state.
+
+``settings.INDIAN_TAX_RATES['GST']`` maps each GST slab (``Product.gst_rate``,
+in percent) to its CGST/SGST/IGST rates. It is compiled once into a table of
+Decimals; a ``CartQuote`` then groups the lines by slab, taxes each group and
+rounds every component to the paisa. Views and templates read the quote's
+attributes instead of re-deriving totals from price strings.
+"""
+import hashlib
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from products.models import Product
+
+PAISA = Decimal('0.01')
+ZERO = Decimal('0')
+
+_compiled = (None, None)
+
+
+def _default_rates():
+    # Equal central/state halves, the whole slab as IGST
+    return {
+        slab: {'cgst': Decimal(slab) / 200, 'sgst': Decimal(slab) / 200, 'igst': Decimal(slab) / 100}
+        for slab in Product.GST_SLABS
+    }
+
+
+def tax_table():
+    """{slab: (cgst, sgst, igst)} as Decimals, rebuilt only when the setting changes."""
+    global _compiled
+    config = getattr(settings, 'INDIAN_TAX_RATES', None)
+    if _compiled[0] is not config or _compiled[1] is None:
+        rates = (config or {}).get('GST') or _default_rates()
+        table = {}
+        for slab, components in rates.items():
+            table[int(slab)] = tuple(Decimal(str(components[key])) for key in ('cgst', 'sgst', 'igst'))
+        missing = set(Product.GST_SLABS) - set(table)
+        if missing:
+            raise ImproperlyConfigured(
+                f"INDIAN_TAX_RATES['GST'] has no rates for slab(s) {sorted(missing)}"
+            )
+        _compiled = (config, table)
+    return _compiled[1]
+
+
+def _percent(rate):
+    value = rate * 100
+    return value.quantize(Decimal(1)) if value == value.to_integral_value() else value.normalize()
+
+
+def quote_key(lines, interstate=False):
+    """Content hash of ``(product_id, quantity, price, slab)`` lines."""
+    content = repr((sorted((str(pid), qty, str(price), slab) for pid, qty, price, slab in lines), interstate))
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+class CartQuote:
+    """
+    Subtotal, GST and grand total for a set of ``(price, quantity, slab)``
+    lines. ``slabs`` lists the breakdown per GST slab, lowest first, each a
+    dict with ``rate``, ``taxable``, the three components and their percentages.
+    """
+
+    def __init__(self, lines, interstate=False):
+        table = tax_table()
+        taxable = {}
+        for price, quantity, slab in lines:
+            taxable[slab] = taxable.get(slab, ZERO) + Decimal(price) * quantity
+
+        self.interstate = interstate
+        self.slabs = []
+        for slab in sorted(taxable):
+            cgst_rate, sgst_rate, igst_rate = table[slab]
+            amount = taxable[slab]
+            if interstate:
+                cgst = sgst = ZERO
+                igst = (amount * igst_rate).quantize(PAISA, ROUND_HALF_UP)
+            else:
+                cgst = (amount * cgst_rate).quantize(PAISA, ROUND_HALF_UP)
+                sgst = (amount * sgst_rate).quantize(PAISA, ROUND_HALF_UP)
+                igst = ZERO
+            self.slabs.append({
+                'rate': slab,
+                'taxable': amount,
+                'cgst': cgst, 'sgst': sgst, 'igst': igst,
+                'cgst_percent': _percent(cgst_rate),
+                'sgst_percent': _percent(sgst_rate),
+                'igst_percent': _percent(igst_rate),
+                'total_tax': cgst + sgst + igst,
+            })
+
+        self.subtotal = sum(taxable.values(), ZERO)
+        self.cgst = sum((s['cgst'] for s in self.slabs), ZERO)
+        self.sgst = sum((s['sgst'] for s in self.slabs), ZERO)
+        self.igst = sum((s['igst'] for s in self.slabs), ZERO)
+        self.total_tax = self.cgst + self.sgst + self.igst
+        self.grand_total = self.subtotal + self.total_tax
+
+    @classmethod
+    def for_items(cls, items, interstate=False):
+        """Quote cart lines or order items (anything with ``price``, ``quantity``, ``product``)."""
+        def line(item):
+            get = item.get if isinstance(item, dict) else lambda name: getattr(item, name)
+            product = get('product')
+            slab = product.gst_rate if product is not None else Product.DEFAULT_GST_SLAB
+            return get('price'), get('quantity'), slab
+        return cls((line(item) for item in items), interstate)
+
+    def as_dict(self):
+        """The shape ``Cart.get_grand_total`` has always returned."""
+        return {
+            'subtotal': self.subtotal,
+            'taxes': {
+                'cgst': self.cgst,
+                'sgst': self.sgst,
+                'igst': self.igst,
+                'total_tax': self.total_tax,
+            },
+            'grand_total': self.grand_total,
+        }
@@ -1,10 +1,17 @@
+from django.contrib import messages
 from django.shortcuts import render, redirect, get_object_or_404
+from products.inventory import available_to_sell
 from products.models import Product
 from .cart import Cart
 
 def add_to_cart(request, product_id):
     cart = Cart(request)
     product = get_object_or_404(Product, id=product_id)
+    in_cart = (cart.get_product(product.id) or {}).get('quantity', 0)
+    # Stock on hand less what other shoppers hold in checkout
+    if available_to_sell([product.id], request.session.session_key).get(product.id, 0) <= in_cart:
+        messages.error(request, f"Sorry, no more {product.name} is available right now.")
+        return redirect('cart:cart_detail')
     cart.add(product=product)
     return redirect('cart:cart_detail')
 
@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from products.models import Product
-from decimal import Decimal
+from cart.quote import CartQuote
 
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
@@ -16,6 +16,14 @@ class Order(models.Model):
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Number of order lines, kept at placement so listings need no COUNT
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Order history: a user's orders, newest first, keyset paged
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id}"
@@ -25,9 +33,12 @@ class Order(models.Model):
         Recalculate subtotal, tax, and total from items.
         Useful if prices or quantities change after creation.
         """
-        self.subtotal = sum(item.get_cost() for item in self.items.all())
-        self.tax_amount = self.subtotal * Decimal('0.18')  # 18% GST
-        self.total = self.subtotal + self.tax_amount
+        items = list(self.items.select_related('product'))
+        quote = CartQuote.for_items(items)  # GST per product slab
+        self.subtotal = quote.subtotal
+        self.tax_amount = quote.total_tax
+        self.total = quote.grand_total
+        self.item_count = len(items)
         return self.total
 
 
@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+
+from cart.quote import CartQuote
+from products.catalog_cache import invalidate_products
+from products.facets import invalidate_facets
+from products.inventory import available_to_sell, can_sell_q
+from products.models import Product, StockHold
+from .models import OrderItem
+
+class InsufficientStock(Exception):
+    """Raised when one or more cart lines can no longer be fulfilled."""
+
+    def __init__(self, products):
+        self.products = products
+        names = ', '.join(p.name for p in products)
+        super().__init__(f"Not enough stock for: {names}")
+
+
+class _StockShortfall(Exception):
+    pass
+
+
+def place_order(order, items, hold_key=None, quote=None):
+    """
+    Save ``order`` with one OrderItem per cart line and take the ordered
+    quantities out of ``Product.stock``.
+
+    ``items`` are cart lines (dicts with ``product``, ``price`` and
+    ``quantity``). The query count does not depend on the number of lines:
+    one INSERT for the order, one conditional UPDATE for all the stock and
+    one bulk INSERT for the items. If any product is short, nothing is
+    written and ``InsufficientStock`` names the products that are short.
+
+    Stock held by other shoppers in checkout is not for sale; the shopper's
+    own holds (``hold_key``) are consumed by the order.
+
+    Totals come from ``quote`` (the cart's ``CartQuote``) when given, so the
+    order stores exactly what checkout showed.
+    """
+    items = [item for item in items if item['product'] is not None]
+    quantities = {item['product'].pk: item['quantity'] for item in items}
+
+    quote = quote or CartQuote.for_items(items)
+    order.subtotal = quote.subtotal
+    order.tax_amount = quote.total_tax
+    order.total = quote.grand_total
+    order.item_count = len(items)
+
+    try:
+        with transaction.atomic():
+            order.save()
+
+            # Every product must still have enough unheld stock for its own
+            # quantity; the row count tells us whether all of them did.
+            wanted = Case(
+                *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+                output_field=IntegerField(),
+            )
+            updated = Product.objects.filter(can_sell_q(wanted, hold_key), pk__in=quantities).update(
+                stock=F('stock') - wanted,
+                updated_at=Now(),
+            )
+            if updated != len(quantities):
+                raise _StockShortfall
+
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=item['product'], price=item['price'], quantity=item['quantity'])
+                for item in items
+            ])
+            if hold_key:
+                StockHold.objects.filter(hold_key=hold_key).delete()
+
+            category_ids = {item['product'].category_id for item in items}
+            # update() skips model signals: refresh what displays stock ourselves
+            transaction.on_commit(lambda: (
+                invalidate_products(quantities.keys(), category_ids),
+                invalidate_facets(),
+            ))
+    except _StockShortfall:
+        # Rolled back; read the committed stock to name the short products
+        order.pk = None
+        available = available_to_sell(quantities, hold_key)
+        raise InsufficientStock([
+            item['product'] for item in items
+            if available.get(item['product'].pk, 0) < item['quantity']
+        ])
+    return order
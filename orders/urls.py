@@ -6,4 +6,5 @@ app_name = 'orders'
 urlpatterns = [
     path('checkout/', views.checkout, name='checkout'),
     path('history/', views.order_history, name='history'),
+    path('history/<int:pk>/items/', views.order_items, name='items'),
 ]
@@ -1,11 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
-from decimal import Decimal
-from .models import Order, OrderItem
+from .models import Order
 from .forms import OrderCreateForm
+from .services import InsufficientStock, place_order
 from cart.cart import Cart
+from products.inventory import reserve
+from products.pagination import CursorPaginator
+
+ORDERS_PER_PAGE = 10
 
 
 @login_required
@@ -16,38 +19,45 @@ def checkout(request):
         messages.warning(request, "Your cart is empty")
         return redirect('cart:cart_detail')
 
-    if request.method == 'POST':
-        form = OrderCreateForm(request.POST)
-        if form.is_valid():
-            with transaction.atomic():
-                order = form.save(commit=False)
-                order.user = request.user
-
-                # Calculate and store values directly
-                subtotal = cart.get_subtotal()
-                tax = subtotal * Decimal('0.18')
-                total = subtotal + tax
-
-                order.subtotal = subtotal
-                order.tax_amount = tax
-                order.total = total
-                order.save()  # ✅ Save before adding items
+    # Refresh prices and stock before showing or placing the order
+    cart_changes = cart.validate_cart()
+    if not cart:
+        messages.warning(request, "The items in your cart are no longer available")
+        return redirect('cart:cart_detail')
 
-                # Create order items
-                for item in cart:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item['product'],
-                        price=item['price'],  # store cart price
-                        quantity=item['quantity']
-                    )
+    # Each checkout visit (re)holds the cart's stock for STOCK_HOLD_MINUTES
+    if not request.session.session_key:
+        request.session.save()
+    hold_key = request.session.session_key
+    shortages = reserve(hold_key, {item_id: item['quantity'] for item_id, item in cart.cart.items()})
+    for item in (cart if shortages else ()):
+        if item['product'] is not None and item['product'].pk in shortages:
+            cart_changes.append({
+                'product_id': item['product_id'],
+                'name': item['product'].name,
+                'reason': 'held',
+                'message': f"Only {shortages[item['product'].pk]} of {item['product'].name} "
+                           f"can be reserved right now; other shoppers are checking out with it.",
+            })
 
+    if request.method == 'POST':
+        form = OrderCreateForm(request.POST)
+        # A cart that just changed is shown again for the customer to confirm
+        if form.is_valid() and not cart_changes:
+            order = form.save(commit=False)
+            order.user = request.user
+            try:
+                place_order(order, cart, hold_key=hold_key, quote=cart.quote())
+            except InsufficientStock as exc:
+                messages.error(request, str(exc))
+                cart_changes = cart.validate_cart()
+            else:
                 cart.clear()
 
                 messages.success(request, "Your order has been placed successfully!")
                 return render(request, 'orders/placed.html', {
                     'order': order,
-                    'order_items': order.items.all()
+                    'order_items': order.items.select_related('product')
                 })
     else:
         initial_data = {
@@ -59,27 +69,30 @@ def checkout(request):
     return render(request, 'orders/checkout.html', {
         'cart': cart,
         'form': form,
-        'subtotal': cart.get_subtotal(),
-        'tax_amount': cart.get_subtotal() * Decimal('0.18'),
-        'grand_total': cart.get_grand_total()
+        'quote': cart.quote(),
+        'cart_changes': cart_changes,
     })
 
 @login_required
 def order_history(request):
-    orders = Order.objects.filter(user=request.user).select_related().prefetch_related('items').order_by('-created_at')
-
-
-
-    for order in orders:
-        order.subtotal = sum(
-            item.price * item.quantity
-            for item in order.items.all()
-        )
-        order.tax_amount = order.subtotal * Decimal('0.18')
-        order.grand_total = order.subtotal + order.tax_amount
-        order.item_count = order.items.count()
+    # Stored totals and item counts only; line items load per order on demand
+    orders = Order.objects.filter(user=request.user)
+    page_obj = CursorPaginator(orders, ORDERS_PER_PAGE).page(request.GET.get('cursor'))
 
     return render(request, 'orders/history.html', {
-        'orders': orders,
+        'orders': page_obj,
+        'page_obj': page_obj,
         'title': 'Order History'
     })
+
+
+@login_required
+def order_items(request, pk):
+    order = get_object_or_404(Order, pk=pk, user=request.user)
+    items = order.items.select_related('product').only(
+        'price', 'quantity', 'order_id', 'product__name'
+    )
+    return render(request, 'orders/_order_items.html', {
+        'order': order,
+        'items': items,
+    })
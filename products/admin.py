@@ -1,15 +1,93 @@
+import json
+
 from django.contrib import admin
-from .models import Category, Product, NewsletterSubscriber
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.urls import path
+from .models import Category, Product, NewsletterCampaign, NewsletterDelivery, NewsletterSubscriber
 from .forms import ProductForm
-from django.utils.html import format_html
-from django.db.models import Count
-from sorl.thumbnail import get_thumbnail
+from django.db.models import Count, Q
+from django.forms import BaseModelFormSet, ModelChoiceField
+
+from . import catalog_cache, search
+from .facets import invalidate_facets
+from .newsletter import subscriber_csv
+from .pagination import EstimatedCountPaginator
+
+
+class LoadedRowChoiceField(ModelChoiceField):
+    """A list_editable row's hidden id, resolved to the row the formset already loaded."""
+
+    def __init__(self, instance, *args, **kwargs):
+        self.instance = instance
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value not in self.empty_values and str(value) == str(self.instance.pk):
+            return self.instance
+        return super().to_python(value)
+
+
+class ListEditFormSet(BaseModelFormSet):
+    # The stock id field runs queryset.get() for every row on save
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self._pk_field.name
+        if form.instance.pk is not None and name in form.fields:
+            field = form.fields[name]
+            form.fields[name] = LoadedRowChoiceField(
+                form.instance, field.queryset, initial=field.initial, required=False, widget=field.widget,
+            )
+
 
 @admin.register(NewsletterSubscriber)
 class NewsletterAdmin(admin.ModelAdmin):
     list_display = ("email", "subscribed_at")
     search_fields = ("email",)
 
+    def get_urls(self):
+        return [
+            path('export.csv', self.admin_site.admin_view(self.export_csv),
+                 name='products_newslettersubscriber_export'),
+        ] + super().get_urls()
+
+    def export_csv(self, request):
+        """The whole list as CSV, streamed (the "Export CSV" button of the changelist)."""
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        return StreamingHttpResponse(
+            subscriber_csv(), content_type='text/csv; charset=utf-8',
+            headers={'Content-Disposition': 'attachment; filename="newsletter-subscribers.csv"'},
+        )
+
+
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    # Campaigns are created and sent by the send_newsletter command
+    list_display = ('name', 'subject', 'created_at', 'finished_at', 'sent_count', 'failed_count')
+    readonly_fields = ('created_at', 'finished_at')
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.annotate(
+            _sent=Count('deliveries', filter=Q(deliveries__status=NewsletterDelivery.SENT)),
+            _failed=Count('deliveries', filter=Q(deliveries__status=NewsletterDelivery.FAILED)),
+        )
+
+    def sent_count(self, obj):
+        return obj._sent
+
+    def failed_count(self, obj):
+        return obj._failed
+
+    sent_count.admin_order_field = '_sent'
+    sent_count.short_description = 'Sent'
+    failed_count.admin_order_field = '_failed'
+    failed_count.short_description = 'Refused'
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -42,7 +120,7 @@ class ProductAdmin(admin.ModelAdmin):
         'created_at',
         "is_featured",
     )
-    list_filter = ('category', 'available', 'created_at',"is_featured")
+    list_filter = ('category', 'available', 'created_at',"is_featured", 'gst_rate')
     search_fields = ('name',)
     list_editable = ('price', 'stock', 'available',"is_featured")
     readonly_fields = ('image_preview', 'created_at', 'updated_at')
@@ -52,7 +130,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('name', 'slug', 'category', 'description','image')
         }),
         ('Pricing', {
-            'fields': ('price', 'stock')
+            'fields': ('price', 'gst_rate', 'stock')
         }),
         ('Status', {
             'fields': ('available',)
@@ -64,19 +142,68 @@ class ProductAdmin(admin.ModelAdmin):
     )
 
     def image_preview(self, obj):
-        if obj.image:
-            try:
-                # Create or retrieve a cached 50x50 thumbnail
-                thumb = get_thumbnail(obj.image, '50x50', crop='center', quality=80)
-                return format_html('<img src="{}" width="50" height="50" />', thumb.url)
-            except Exception:
-                return "(Invalid image)"
-        return "(No image)"
+        return obj.image_preview()
 
     image_preview.short_description = 'Preview'
 
     # For better UX in large databases
     autocomplete_fields = ['category']
     show_full_result_count = False
+    # One join for the category column instead of a query per row
+    list_select_related = ('category',)
+    paginator = EstimatedCountPaginator
+    # The date drill-down (templates/admin/products/product/change_list.html)
+    # probes date ranges instead of scanning for distinct dates
+
+    def get_changelist_formset(self, request, **kwargs):
+        return super().get_changelist_formset(request, formset=ListEditFormSet, **kwargs)
+
+    def changelist_view(self, request, extra_context=None):
+        if not (request.method == 'POST' and '_save' in request.POST):
+            return super().changelist_view(request, extra_context)
+        # Django saves and logs list_editable rows one at a time; save_model()
+        # and log_change() below only collect them, written here in bulk
+        request.list_edits = edits = {'products': [], 'fields': set(), 'log': []}
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            if edits['products']:
+                self._save_list_edits(**edits)
+        return response
+
+    def save_model(self, request, obj, form, change):
+        edits = getattr(request, 'list_edits', None)
+        if edits is None:
+            return super().save_model(request, obj, form, change)
+        edits['products'].append(obj)
+        edits['fields'].update(form.changed_data)
+
+    def log_change(self, request, obj, message):
+        edits = getattr(request, 'list_edits', None)
+        if edits is None:
+            return super().log_change(request, obj, message)
+        edits['log'].append(LogEntry(
+            user_id=request.user.pk,
+            content_type=ContentType.objects.get_for_model(obj, for_concrete_model=False),
+            object_id=str(obj.pk),
+            object_repr=str(obj)[:200],
+            action_flag=CHANGE,
+            change_message=json.dumps(message) if isinstance(message, list) else message,
+        ))
+
+    def _save_list_edits(self, products, fields, log):
+        # INSERT ... ON CONFLICT (id) DO UPDATE, as import_catalog does; no
+        # per-row save() signals, so reindex and invalidate once for the page
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=['id'],
+            update_fields=sorted(fields | {'updated_at'}),
+        )
+        LogEntry.objects.bulk_create(log)
+        product_ids = [p.pk for p in products]
+        category_ids = {p.category_id for p in products}
+        search.index_products(product_ids)
+        transaction.on_commit(lambda: (
+            catalog_cache.invalidate_products(product_ids, category_ids),
+            invalidate_facets(),
+        ))
 
 
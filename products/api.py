@@ -0,0 +1,218 @@
+"""
+Read-only JSON catalog API for the mobile app and partner feeds.
+
+    GET /products/api/categories/
+    GET /products/api/products/?query=&category=&min_price=&max_price=&in_stock=&cursor=&limit=&fields=
+    GET /products/api/products/<id>/?fields=
+    GET /products/api/products/export.ndjson?fields=  (and the listing filters)
+
+``fields`` picks the keys of each product, e.g. ``?fields=id,name,price``.
+Only the columns behind them are selected with ``values_list()``, and rows
+become dicts directly, without model instances. Listings take the same
+filters as the storefront's ``ProductSearchForm`` and page on the same
+(created_at, id) cursors, newest first. The export streams every matching
+product as one JSON object per line, ``EXPORT_CHUNK_SIZE`` rows at a time,
+so memory stays flat whatever the catalog size.
+"""
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+
+from .catalog_cache import get_categories
+from .forms import ProductSearchForm
+from .models import Product
+from .page_cache import conditional_page, listing_etag
+from .pagination import CursorPaginator
+from .search import match_products
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+EXPORT_CHUNK_SIZE = 2000
+
+# Public field -> the column it is read from
+COLUMNS = {
+    'id': 'id',
+    'sku': 'sku',
+    'name': 'name',
+    'slug': 'slug',
+    'description': 'description',
+    'category': 'category__slug',
+    'category_id': 'category_id',
+    'price': 'price',
+    'gst_rate': 'gst_rate',
+    'stock': 'stock',
+    'available': 'available',
+    'is_featured': 'is_featured',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+# Fields computed from other columns, and the columns they need
+COMPUTED = {
+    'url': ('id', 'slug'),
+    'image': ('image',),
+}
+LIST_FIELDS = ('id', 'sku', 'name', 'slug', 'category', 'price', 'stock', 'url', 'image')
+DETAIL_FIELDS = tuple(COLUMNS) + tuple(COMPUTED)
+
+
+class FieldError(ValueError):
+    """A bad ``fields`` or filter parameter; the message is the 400's body."""
+
+
+class FieldSet:
+    """The columns to select for a list of fields, and how to build each row's dict."""
+
+    def __init__(self, names):
+        unknown = [name for name in names if name not in COLUMNS and name not in COMPUTED]
+        if unknown:
+            raise FieldError(f"Unknown fields: {', '.join(unknown)}. "
+                             f"Choose from: {', '.join(DETAIL_FIELDS)}")
+        # id and created_at always, for cursors
+        columns = ['id', 'created_at']
+        for name in names:
+            for column in COMPUTED.get(name, (COLUMNS.get(name),)):
+                if column not in columns:
+                    columns.append(column)
+        self.columns = columns
+        position = {column: i for i, column in enumerate(columns)}
+        self._getters = [(name, self._getter(name, position)) for name in names]
+
+    @staticmethod
+    def _getter(name, position):
+        if name == 'url':
+            pk, slug = position['id'], position['slug']
+            # reverse() once, not per row: it dominates a large export otherwise
+            pattern = reverse('products:detail_with_slug', kwargs={'pk': 0, 'slug': 'slug'})
+            pattern = pattern.replace('/0/slug/', '/{}/{}/')
+            return lambda row: pattern.format(row[pk], row[slug])
+        if name == 'image':
+            image = position['image']
+            return lambda row: default_storage.url(row[image]) if row[image] else None
+        column = position[COLUMNS[name]]
+        return lambda row: row[column]
+
+    @classmethod
+    def from_request(cls, request, default):
+        requested = request.GET.get('fields', '')
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        # Keep the order asked for, without repeats
+        return cls(list(dict.fromkeys(names)) or list(default))
+
+    def values(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def serialize(self, row):
+        return {name: get(row) for name, get in self._getters}
+
+
+def _error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _filtered_products(request):
+    """Available products matching the storefront filters in the query string."""
+    form = ProductSearchForm(request.GET)
+    if not form.is_valid():
+        raise FieldError({field: [e['message'] for e in errors]
+                          for field, errors in form.errors.get_json_data().items()})
+    data = form.cleaned_data
+    products = Product.objects.filter(available=True)
+    if data.get('query'):
+        products = match_products(products, data['query'])
+    if data.get('category'):
+        products = products.filter(category=data['category'])
+    if data.get('min_price') is not None:
+        products = products.filter(price__gte=data['min_price'])
+    if data.get('max_price') is not None:
+        products = products.filter(price__lte=data['max_price'])
+    if data.get('in_stock'):
+        products = products.filter(stock__gt=0)
+    return products
+
+
+@require_safe
+@conditional_page(listing_etag)
+def categories(request):
+    return JsonResponse({'results': [
+        {'id': category.pk, 'name': category.name, 'slug': category.slug,
+         'url': reverse('products:by_category', args=[category.slug])}
+        for category in get_categories()
+    ]})
+
+
+@require_safe
+@conditional_page(listing_etag)
+def product_list(request):
+    try:
+        fields = FieldSet.from_request(request, LIST_FIELDS)
+        products = _filtered_products(request)
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except FieldError as exc:
+        return _error(exc.args[0])
+    except ValueError:
+        return _error("limit must be a number")
+
+    page = CursorPaginator(fields.values(products), limit, key=lambda row: (row[1], row[0])).page(
+        request.GET.get('cursor')
+    )
+
+    def link(cursor):
+        if cursor is None:
+            return None
+        params = request.GET.copy()
+        params['cursor'] = cursor
+        return f'{request.path}?{params.urlencode()}'
+
+    return JsonResponse({
+        'results': [fields.serialize(row) for row in page],
+        'next': link(page.next_cursor),
+        'previous': link(page.previous_cursor),
+    })
+
+
+@require_safe
+def product_detail(request, pk):
+    try:
+        fields = FieldSet.from_request(request, DETAIL_FIELDS)
+    except FieldError as exc:
+        return _error(exc.args[0])
+    # Unordered: the pk lookup is unique, and first() would add a sort
+    row = next(iter(fields.values(Product.objects.filter(pk=pk, available=True).order_by())), None)
+    if row is None:
+        return _error("No product with this id.", status=404)
+    return JsonResponse(fields.serialize(row))
+
+
+@require_safe
+@conditional_page(listing_etag)
+def product_export(request):
+    try:
+        fields = FieldSet.from_request(request, DETAIL_FIELDS)
+        products = _filtered_products(request)
+    except FieldError as exc:
+        return _error(exc.args[0])
+    rows = fields.values(products.order_by('pk'))
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+
+    if isinstance(request, ASGIRequest):
+        # Django reads a sync iterator whole before sending it over ASGI. And
+        # aiterator() runs values_list() queries on the event loop in 4.2.
+        rows = rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+
+        async def lines():
+            while chunk := await next_chunk():
+                for row in chunk:
+                    yield encoder.encode(fields.serialize(row)) + '\n'
+    else:
+        def lines():
+            for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+                yield encoder.encode(fields.serialize(row)) + '\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
@@ -6,5 +6,4 @@ class ProductsConfig(AppConfig):
     name = 'products'
 
     def ready(self):
-        # Import signals or other startup code here if needed
-        pass
\ No newline at end of file
+        from . import signals  # noqa: F401
@@ -0,0 +1,32 @@
+"""
+Version counters for cache namespaces that are retired all at once.
+
+Entries of a namespace embed its current version in their keys. Bumping
+the version leaves every older entry to expire unread: one cache write
+invalidates the whole namespace, however many keys it holds. The
+counters never expire; a lost one restarts from the clock, which is
+always ahead of any version handed out before.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _new_version():
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    return cache.get_or_set(key, _new_version, None)
+
+
+async def aget_version(key):
+    return await cache.aget_or_set(key, _new_version, None)
+
+
+def bump_version(key):
+    """Move ``key`` on to a new version."""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), None)
@@ -0,0 +1,224 @@
+"""
+Read-through cache for catalog data that changes a few times a day.
+
+Entries are filled on first read and deleted by the Product/Category
+signal handlers in ``signals.py``; the timeout is only a safety net.
+Bulk writes that skip signals (``queryset.update``) must call
+``invalidate_products``/``invalidate_categories`` themselves. Both also
+retire the cached pages and fragments (see ``page_cache``).
+
+A product's recommended neighbours are cached as ids only and resolved
+through the per-product entries on each read, so a neighbour that is
+edited or withdrawn drops out at once rather than when the list expires.
+
+The ``a``-prefixed functions are the same reads for async views: the cache
+through its async API, misses through the async ORM, under the same keys.
+"""
+import asyncio
+import time
+
+from django.core.cache import cache
+
+from .models import Category, Product, ProductRecommendation
+from .page_cache import invalidate_pages
+
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 6
+
+FEATURED_LIMIT = 8
+RELATED_LIMIT = 4
+# Neighbours are rebuilt in batch (products.recommendations), not on writes
+RECOMMENDATIONS_TIMEOUT = 60 * 30
+# Neighbour ids cached per product; spares stand in for unavailable ones
+RECOMMENDED_CANDIDATES = RELATED_LIMIT * 2
+
+# Stampede protection: the first worker to miss a key takes a short lock and
+# recomputes it; the others poll for the fresh value instead of piling on.
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+
+_MISSING = '__missing__'
+
+FEATURED_KEY = 'catalog:featured'
+CATEGORIES_KEY = 'catalog:categories'
+
+
+def product_key(pk):
+    return f'catalog:product:{pk}'
+
+
+def related_key(category_id):
+    return f'catalog:related:{category_id}'
+
+
+def recommended_key(pk):
+    return f'catalog:recommended:{pk}'
+
+
+def read_through(key, compute, timeout=CATALOG_CACHE_TIMEOUT):
+    value = cache.get(key)
+    if value is not None:
+        return None if value == _MISSING else value
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                return None if value == _MISSING else value
+        # The lock holder is slow or gone; compute without caching twice
+        return compute()
+
+    try:
+        value = compute()
+        cache.set(key, _MISSING if value is None else value, timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+async def aread_through(key, acompute, timeout=CATALOG_CACHE_TIMEOUT):
+    """``read_through`` with a coroutine function for ``acompute``."""
+    value = await cache.aget(key)
+    if value is not None:
+        return None if value == _MISSING else value
+
+    lock_key = f'{key}:lock'
+    if not await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            value = await cache.aget(key)
+            if value is not None:
+                return None if value == _MISSING else value
+        return await acompute()
+
+    try:
+        value = await acompute()
+        await cache.aset(key, _MISSING if value is None else value, timeout)
+    finally:
+        await cache.adelete(lock_key)
+    return value
+
+
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+
+def _recommended_ids(product):
+    return (
+        ProductRecommendation.objects.filter(product=product)
+        .order_by('-score', 'recommended_id').values_list('recommended_id', flat=True)[:RECOMMENDED_CANDIDATES]
+    )
+
+
+def _in_order(pks, cached):
+    products = (cached[product_key(pk)] for pk in pks)
+    return [product for product in products if product != _MISSING]
+
+
+def get_featured_products():
+    return read_through(FEATURED_KEY, lambda: list(
+        Product.objects.filter(is_featured=True, available=True)[:FEATURED_LIMIT]
+    ))
+
+
+def get_categories():
+    return read_through(CATEGORIES_KEY, lambda: list(Category.objects.all()))
+
+
+def get_product(pk):
+    """Available product with its category, or None."""
+    def compute():
+        # Unordered: the pk lookup is unique, and first() would add a sort
+        products = Product.objects.select_related('category').filter(pk=pk, available=True).order_by()
+        return next(iter(products), None)
+    return read_through(product_key(pk), compute)
+
+
+def get_products(pks):
+    """The available products among ``pks``, in that order, through the per-product entries."""
+    cached = cache.get_many([product_key(pk) for pk in pks])
+    missing = [pk for pk in pks if product_key(pk) not in cached]
+    if missing:
+        found = Product.objects.select_related('category').filter(available=True).in_bulk(missing)
+        # Entries as get_product writes them, unavailable products included
+        entries = {product_key(pk): found.get(pk, _MISSING) for pk in missing}
+        cache.set_many(entries, CATALOG_CACHE_TIMEOUT)
+        cached.update(entries)
+    return _in_order(pks, cached)
+
+
+def get_related_products(product):
+    """
+    Up to RELATED_LIMIT precomputed neighbours (``build_recommendations``),
+    best first. Before the first run, other products from the same category.
+    """
+    pks = read_through(recommended_key(product.pk), lambda: list(_recommended_ids(product)), RECOMMENDATIONS_TIMEOUT)
+    recommended = get_products(pks)[:RELATED_LIMIT]
+    if recommended:
+        return recommended
+    related = read_through(related_key(product.category_id), lambda: list(
+        Product.objects.filter(category_id=product.category_id, available=True)[:RELATED_LIMIT + 1]
+    ))
+    return [p for p in related if p.pk != product.pk][:RELATED_LIMIT]
+
+
+async def aget_featured_products():
+    return await aread_through(FEATURED_KEY, lambda: _alist(
+        Product.objects.filter(is_featured=True, available=True)[:FEATURED_LIMIT]
+    ))
+
+
+async def aget_categories():
+    return await aread_through(CATEGORIES_KEY, lambda: _alist(Category.objects.all()))
+
+
+async def aget_product(pk):
+    async def compute():
+        products = Product.objects.select_related('category').filter(pk=pk, available=True).order_by()
+        async for product in products:
+            return product
+        return None
+    return await aread_through(product_key(pk), compute)
+
+
+async def aget_products(pks):
+    cached = await cache.aget_many([product_key(pk) for pk in pks])
+    missing = [pk for pk in pks if product_key(pk) not in cached]
+    if missing:
+        products = Product.objects.select_related('category').filter(pk__in=missing, available=True)
+        found = {product.pk: product async for product in products}
+        entries = {product_key(pk): found.get(pk, _MISSING) for pk in missing}
+        await cache.aset_many(entries, CATALOG_CACHE_TIMEOUT)
+        cached.update(entries)
+    return _in_order(pks, cached)
+
+
+async def aget_related_products(product):
+    pks = await aread_through(
+        recommended_key(product.pk), lambda: _alist(_recommended_ids(product)), RECOMMENDATIONS_TIMEOUT,
+    )
+    recommended = (await aget_products(pks))[:RELATED_LIMIT]
+    if recommended:
+        return recommended
+    related = await aread_through(related_key(product.category_id), lambda: _alist(
+        Product.objects.filter(category_id=product.category_id, available=True)[:RELATED_LIMIT + 1]
+    ))
+    return [p for p in related if p.pk != product.pk][:RELATED_LIMIT]
+
+
+def invalidate_products(product_ids=(), category_ids=()):
+    keys = [FEATURED_KEY]
+    keys += [key for pk in product_ids for key in (product_key(pk), recommended_key(pk))]
+    keys += [related_key(category_id) for category_id in set(category_ids)]
+    cache.delete_many(keys)
+    invalidate_pages()
+
+
+def invalidate_categories(category_ids=()):
+    product_ids = Product.objects.filter(category_id__in=category_ids).values_list('pk', flat=True)
+    invalidate_products(product_ids, category_ids)
+    cache.delete(CATEGORIES_KEY)
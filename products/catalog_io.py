@@ -0,0 +1,260 @@
+"""
+Bulk catalog import and export (CSV or JSON Lines), used by the
+``import_catalog`` and ``export_catalog`` commands.
+
+Rows are read and written one chunk at a time, so memory does not grow
+with the file. Each import chunk costs a fixed handful of queries: look up
+its SKUs and categories, create the missing categories, then one upsert
+on SKU for the known products and one ``bulk_create`` for the new ones. Bulk writes skip the Product
+signals, so the search index and catalog caches are refreshed per chunk
+here instead.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from . import catalog_cache, search
+from .facets import invalidate_facets
+from .models import Category, Product
+
+FIELDS = ('sku', 'name', 'category', 'description', 'price', 'gst_rate', 'stock', 'available', 'is_featured')
+# Columns copied onto Product as they are (category is resolved to a row)
+PRODUCT_FIELDS = ('name', 'description', 'price', 'gst_rate', 'stock', 'available', 'is_featured')
+# Keeps every IN (...) list under SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+_TRUE = {'1', 'true', 'yes', 'y', 't'}
+_FALSE = {'0', 'false', 'no', 'n', 'f'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def guess_format(path):
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line number, dict) from a CSV (with header) or JSON Lines text
+    stream. A line that is not valid JSON comes out as a ``RowError`` in
+    place of the dict, so the import reports it and carries on.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as exc:
+            yield number, RowError(f"not valid JSON: {exc}")
+
+
+def _flag(value, default):
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if not text:
+        return default
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise RowError(f"not a yes/no value: {value!r}")
+
+
+def clean_row(row):
+    """Normalise one input row; only the columns present are returned."""
+    if not isinstance(row, dict):
+        raise RowError("not an object of product fields")
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise RowError("missing sku")
+    cleaned = {'sku': sku}
+    if row.get('name') not in (None, ''):
+        cleaned['name'] = str(row['name']).strip()[:200]
+    if row.get('description') is not None:
+        cleaned['description'] = str(row['description'])
+    if row.get('category') is not None:
+        cleaned['category'] = str(row['category']).strip()[:100]
+    if row.get('price') not in (None, ''):
+        try:
+            cleaned['price'] = Decimal(str(row['price'])).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise RowError(f"bad price {row['price']!r}")
+        if cleaned['price'] <= 0:
+            raise RowError("price must be positive")
+    for field in ('stock', 'gst_rate'):
+        if row.get(field) not in (None, ''):
+            try:
+                cleaned[field] = int(row[field])
+            except (TypeError, ValueError):
+                raise RowError(f"bad {field} {row[field]!r}")
+    if cleaned.get('stock', 0) < 0:
+        raise RowError("stock cannot be negative")
+    if 'gst_rate' in cleaned and cleaned['gst_rate'] not in Product.GST_SLABS:
+        raise RowError(f"GST slab must be one of {Product.GST_SLABS}")
+    for field in ('available', 'is_featured'):
+        if field in row:
+            cleaned[field] = _flag(row[field], None)
+    return cleaned
+
+
+class CatalogImporter:
+    """Upsert products by SKU, one chunk at a time. Counters accumulate across chunks."""
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.categories = {}
+        self.created = self.updated = self.skipped = 0
+        self.errors = []
+
+    def chunks(self, numbered_rows):
+        """Split ``read_rows()`` output into lists of (line number, row) of at most ``chunk_size``."""
+        rows = iter(numbered_rows)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def import_chunk(self, numbered_rows):
+        by_sku = {}
+        for number, row in numbered_rows:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                cleaned = clean_row(row)
+            except RowError as exc:
+                self.skipped += 1
+                self.errors.append((number, str(exc)))
+                continue
+            # A SKU repeated within the chunk: the last row wins
+            by_sku[cleaned['sku']] = (number, cleaned)
+        if not by_sku:
+            return
+
+        with transaction.atomic():
+            self._resolve_categories(cleaned for _, cleaned in by_sku.values())
+            existing = Product.objects.in_bulk(list(by_sku), field_name='sku')
+
+            to_update, to_create, update_fields = [], [], set()
+            for sku, (number, cleaned) in by_sku.items():
+                product = existing.get(sku)
+                if product is None:
+                    missing = [f for f in ('name', 'price') if f not in cleaned]
+                    if missing:
+                        self.skipped += 1
+                        self.errors.append((number, f"new product needs {', '.join(missing)}"))
+                        continue
+                    product = Product(sku=sku, description='')
+                    to_create.append(product)
+                else:
+                    to_update.append(product)
+                for field in PRODUCT_FIELDS:
+                    if cleaned.get(field) is not None:
+                        setattr(product, field, cleaned[field])
+                        update_fields.add(field)
+                if 'category' in cleaned:
+                    product.category_id = self.categories.get(cleaned['category'])
+                    update_fields.add('category')
+
+            old_category_ids = {p._loaded_category_id for p in to_update}
+            if to_update and update_fields:
+                # INSERT ... ON CONFLICT (sku) DO UPDATE: linear in the chunk,
+                # unlike bulk_update's CASE WHEN per row
+                Product.objects.bulk_create(
+                    to_update, update_conflicts=True, unique_fields=['sku'],
+                    update_fields=sorted(update_fields | {'updated_at'}),
+                )
+            self._assign_slugs(to_create)
+            Product.objects.bulk_create(to_create)
+
+            product_ids = [p.pk for p in to_update + to_create]
+            category_ids = old_category_ids | {p.category_id for p in to_update + to_create}
+            search.index_products(product_ids)
+            transaction.on_commit(lambda: (
+                catalog_cache.invalidate_products(product_ids, category_ids),
+                invalidate_facets(),
+            ))
+        self.updated += len(to_update)
+        self.created += len(to_create)
+
+    def _resolve_categories(self, rows):
+        names = {row['category'] for row in rows if row.get('category')} - set(self.categories)
+        if not names:
+            return
+        found = dict(Category.objects.filter(name__in=names).values_list('name', 'pk'))
+        missing = names - set(found)
+        if missing:
+            taken = set(Category.objects.filter(slug__in=[slugify(n) for n in missing]).values_list('slug', flat=True))
+            new = []
+            for name in sorted(missing):
+                slug = _free_slug(slugify(name)[:90] or 'category', taken)
+                taken.add(slug)
+                new.append(Category(name=name, slug=slug))
+            Category.objects.bulk_create(new, ignore_conflicts=True)
+            found.update(Category.objects.filter(name__in=missing).values_list('name', 'pk'))
+            # bulk_create sends no signals: drop the cached category list
+            transaction.on_commit(lambda: catalog_cache.invalidate_categories())
+        self.categories.update(found)
+
+    def _assign_slugs(self, products):
+        """Unique slugs for a chunk in two queries: the plain name, else name + SKU."""
+        if not products:
+            return
+        bases = [slugify(p.name)[:150] or 'product' for p in products]
+        fallbacks = [f'{base}-{slugify(p.sku)[:40]}' for base, p in zip(bases, products)]
+        taken = set(Product.objects.filter(slug__in=set(bases)).values_list('slug', flat=True))
+        taken |= set(Product.objects.filter(slug__in=set(fallbacks)).values_list('slug', flat=True))
+        for product, base, fallback in zip(products, bases, fallbacks):
+            product.slug = base if base not in taken else _free_slug(fallback, taken)
+            taken.add(product.slug)
+
+
+def _free_slug(base, taken):
+    slug, suffix = base, 2
+    while slug in taken:
+        slug = f'{base}-{suffix}'
+        suffix += 1
+    return slug
+
+
+def export_rows(queryset=None, chunk_size=CHUNK_SIZE):
+    """Yield one dict per product in FIELDS order, streamed from the database."""
+    queryset = Product.objects.all() if queryset is None else queryset
+    columns = ('sku', 'name', 'category__name', 'description', 'price', 'gst_rate',
+               'stock', 'available', 'is_featured')
+    for values in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size):
+        row = dict(zip(FIELDS, values))
+        row['price'] = str(row['price'])
+        row['category'] = row['category'] or ''
+        yield row
+
+
+def write_rows(rows, stream, fmt):
+    written = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False))
+            stream.write('\n')
+            written += 1
+    return written
@@ -0,0 +1,112 @@
+import hashlib
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .cache_versions import bump_version, get_version
+
+FACET_CACHE_TIMEOUT = 60 * 10
+FACET_VERSION_KEY = 'facets:version'
+
+# (label, min inclusive, max exclusive) in rupees
+PRICE_BUCKETS = (
+    ('Under ₹500', None, Decimal('500')),
+    ('₹500 – ₹1,000', Decimal('500'), Decimal('1000')),
+    ('₹1,000 – ₹2,500', Decimal('1000'), Decimal('2500')),
+    ('₹2,500 & above', Decimal('2500'), None),
+)
+# Smallest price difference (Product.price has two decimal places). A
+# bucket's link filters on max_price = its upper bound less one step,
+# since max_price is inclusive and the bucket's upper bound is not.
+PRICE_STEP = Decimal('0.01')
+
+
+def filter_key(category_slug=None, query='', category=None, min_price=None,
+               max_price=None, in_stock=False):
+    """Stable key for a filter set, so equivalent searches share a cache entry."""
+    parts = [
+        category_slug or '',
+        ' '.join((query or '').lower().split()),
+        str(category.pk) if category else '',
+        str(min_price.normalize()) if min_price is not None else '',
+        str(max_price.normalize()) if max_price is not None else '',
+        '1' if in_stock else '',
+    ]
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _price_q(min_price, max_price):
+    q = Q()
+    if min_price is not None:
+        q &= Q(price__gte=min_price)
+    if max_price is not None:
+        q &= Q(price__lte=max_price)
+    return q
+
+
+def _bucket_q(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def compute_facets(base_queryset, category=None, min_price=None, max_price=None,
+                   in_stock=False):
+    """
+    Count categories, price buckets and in-stock products in one GROUP BY
+    query over ``base_queryset`` (the listing before the facet filters).
+
+    Each facet ignores its own filter and respects the others, so the
+    category counts show what picking another category would return, and
+    the price buckets show what picking another range would return.
+    """
+    price_q = _price_q(min_price, max_price)
+    stock_q = Q(stock__gt=0) if in_stock else Q()
+
+    aggregates = {
+        'matching': Count('id', filter=price_q & stock_q),
+        'in_stock': Count('id', filter=price_q & Q(stock__gt=0)),
+    }
+    for index, (_, low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'bucket_{index}'] = Count('id', filter=_bucket_q(low, high) & stock_q)
+
+    rows = base_queryset.order_by().values('category_id').annotate(**aggregates)
+
+    category_counts = {}
+    in_stock_count = 0
+    bucket_counts = [0] * len(PRICE_BUCKETS)
+    for row in rows:
+        category_counts[row['category_id']] = row['matching']
+        if category is not None and row['category_id'] != category.pk:
+            continue
+        in_stock_count += row['in_stock']
+        for index in range(len(PRICE_BUCKETS)):
+            bucket_counts[index] += row[f'bucket_{index}']
+
+    return {
+        'categories': category_counts,
+        'price_buckets': [
+            {'label': label, 'min': low, 'max': high, 'count': count}
+            for (label, low, high), count in zip(PRICE_BUCKETS, bucket_counts)
+        ],
+        'in_stock': in_stock_count,
+    }
+
+
+def get_facets(base_queryset, key, **filters):
+    """Cached ``compute_facets`` for the normalized filter set ``key``."""
+    cache_key = f'facets:{get_version(FACET_VERSION_KEY)}:{key}'
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = compute_facets(base_queryset, **filters)
+        cache.set(cache_key, facets, FACET_CACHE_TIMEOUT)
+    return facets
+
+
+def invalidate_facets():
+    """Retire every cached facet set at once by moving to a new version."""
+    bump_version(FACET_VERSION_KEY)
@@ -2,6 +2,7 @@ from django import forms
 from .models import Product, Category
 from django.core.validators import MinValueValidator
 from .models import NewsletterSubscriber
+from .catalog_cache import get_categories
 
 class NewsletterForm(forms.ModelForm):
     class Meta:
@@ -9,16 +10,30 @@ class NewsletterForm(forms.ModelForm):
         fields = ['email']
 
 
+class CachedCategoryChoiceField(forms.ModelChoiceField):
+    """Looks the submitted category up in the cached list instead of querying for it."""
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        category = next((cat for cat in get_categories() if str(cat.pk) == str(value)), None)
+        if category is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'], code='invalid_choice', params={'value': value},
+            )
+        return category
+
+
 class ProductSearchForm(forms.Form):
     query = forms.CharField(
         label='Search Products',
         required=False,
         widget=forms.TextInput(attrs={
-            'placeholder': 'Search by name',
+            'placeholder': 'Search by name, description or category',
             'class': 'form-control'
         })
     )
-    category = forms.ModelChoiceField(
+    category = CachedCategoryChoiceField(
         queryset=Category.objects.all(),
         required=False,
         empty_label="All Categories",
@@ -56,7 +71,7 @@ class ProductForm(forms.ModelForm):
 
     class Meta:
         model = Product
-        fields = ['name', 'category', 'description', 'price', 'image', 'stock', 'available']
+        fields = ['name', 'category', 'description', 'price', 'gst_rate', 'image', 'stock', 'available']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'category': forms.Select(attrs={'class': 'form-select'}),
@@ -0,0 +1,160 @@
+"""
+Responsive derivatives of ``Product.image``.
+
+Each upload is resized once to a fixed set of widths, in JPEG and WebP.
+The file names and sizes are stored in ``Product.image_variants``, so
+templates can build ``srcset`` attributes from the row alone, without
+Pillow or filesystem access on the request path.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = (200, 400, 800, 1200)
+DERIVATIVE_FORMATS = {
+    # format: (Pillow format, file extension, save options)
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+DERIVATIVE_DIR = 'product_images/derivatives'
+# Square crop shown in the admin changelist
+THUMBNAIL_SIZE = 50
+
+# Uploads are resized on a small in-process pool after the saving
+# transaction commits; the warm_thumbnails command catches up on anything
+# a restart interrupted.
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-variants')
+
+
+def _flatten(image):
+    """JPEG has no alpha channel: composite transparent images onto white."""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+def _save(name, image, pil_format, options):
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(product):
+    """Resize ``product.image`` and return the metadata to store on the row."""
+    with product.image.open('rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+
+    width, height = original.size
+    stem = os.path.splitext(os.path.basename(product.image.name))[0]
+    # Never upscale; the original width stands in for the larger sizes
+    widths = sorted({min(w, width) for w in DERIVATIVE_WIDTHS})
+
+    variants = {'source': product.image.name, 'width': width, 'height': height}
+    for key, (pil_format, extension, options) in DERIVATIVE_FORMATS.items():
+        if key == 'webp':
+            base = original if original.mode in ('RGB', 'RGBA') else original.convert('RGBA')
+        else:
+            base = _flatten(original)
+        entries = []
+        for target in widths:
+            resized = base.copy()
+            resized.thumbnail((target, height), Image.LANCZOS)
+            name = f'{DERIVATIVE_DIR}/{product.pk}/{stem}-{target}w.{extension}'
+            name = _save(name, resized, pil_format, options)
+            entries.append({'name': name, 'width': resized.width, 'height': resized.height})
+        variants[key] = entries
+
+    thumb = ImageOps.fit(_flatten(original), (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    pil_format, extension, options = DERIVATIVE_FORMATS['jpeg']
+    name = f'{DERIVATIVE_DIR}/{product.pk}/{stem}-thumb.{extension}'
+    variants['thumb'] = {
+        'name': _save(name, thumb, pil_format, options),
+        'width': THUMBNAIL_SIZE,
+        'height': THUMBNAIL_SIZE,
+    }
+    return variants
+
+
+def _variant_names(variants):
+    variants = variants or {}
+    names = {e['name'] for key in DERIVATIVE_FORMATS for e in variants.get(key, [])}
+    if variants.get('thumb'):
+        names.add(variants['thumb']['name'])
+    return names
+
+
+def delete_variants(variants, keep=()):
+    for name in _variant_names(variants) - set(keep):
+        default_storage.delete(name)
+
+
+def variants_are_current(product):
+    if not product.image:
+        return not product.image_variants
+    return product.image_variants.get('source') == product.image.name
+
+
+def refresh_variants(product):
+    """
+    (Re)generate derivatives when the image changed and store the metadata
+    with a queryset update, so saving the row does not recurse into signals.
+    ``updated_at`` moves too: the detail page's ETag and Last-Modified
+    follow it, and the ``<picture>`` markup changes with the variants.
+    """
+    from .models import Product
+
+    if variants_are_current(product):
+        return product.image_variants
+    old = product.image_variants
+    variants = build_variants(product) if product.image else {}
+    now = timezone.now()
+    Product.objects.filter(pk=product.pk).update(image_variants=variants, updated_at=now)
+    product.image_variants, product.updated_at = variants, now
+    # Derivative names are stable per size, so only prune what is no longer listed
+    delete_variants(old, keep=_variant_names(variants))
+    return variants
+
+
+def _refresh_in_background(pk):
+    from . import catalog_cache
+    from .models import Product
+
+    close_old_connections()
+    try:
+        product = Product.objects.filter(pk=pk).first()
+        if product is None or variants_are_current(product):
+            return
+        refresh_variants(product)
+        # The metadata was written with update(), which sends no signals
+        catalog_cache.invalidate_products([pk], [product.category_id])
+    except Exception:
+        logger.exception("Could not build image variants for product %s", pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_refresh(product):
+    """Queue derivative generation for ``product`` once its save commits."""
+    if variants_are_current(product):
+        return
+    if not getattr(settings, 'IMAGE_VARIANTS_IN_BACKGROUND', True):
+        refresh_variants(product)
+        return
+    pk = product.pk
+    transaction.on_commit(lambda: _executor.submit(_refresh_in_background, pk))
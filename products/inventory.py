@@ -0,0 +1,110 @@
+"""
+Stock holds: short-lived reservations placed when a shopper enters
+checkout, turned into real stock decrements when the order is placed.
+
+Available-to-sell is ``Product.stock`` minus the live holds of *other*
+shoppers, summed through the (product, expires_at) index. Every write
+that depends on it is a single conditional statement, so two checkouts
+racing for the last unit cannot both win.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockHold
+
+DEFAULT_HOLD_MINUTES = 15
+
+
+def hold_duration():
+    return timedelta(minutes=getattr(settings, 'STOCK_HOLD_MINUTES', DEFAULT_HOLD_MINUTES))
+
+
+def held_by_others(hold_key=None, now=None):
+    """Subquery: units of ``OuterRef('pk')`` held by live holds other than ``hold_key``."""
+    holds = StockHold.objects.filter(product=OuterRef('pk'), expires_at__gt=now or timezone.now())
+    if hold_key:
+        holds = holds.exclude(hold_key=hold_key)
+    return Coalesce(
+        Subquery(holds.order_by().values('product').annotate(total=Sum('quantity')).values('total'),
+                 output_field=IntegerField()),
+        0,
+    )
+
+
+def available_to_sell(product_ids, hold_key=None):
+    """{product_id: units a shopper holding ``hold_key`` could still buy} in one query."""
+    rows = Product.objects.filter(pk__in=product_ids).annotate(
+        held=held_by_others(hold_key)
+    ).values_list('pk', 'stock', 'held')
+    return {pk: max(stock - held, 0) for pk, stock, held in rows}
+
+
+def reserve(hold_key, quantities):
+    """
+    Hold ``quantities`` ({product_id: units}) for ``hold_key`` for the next
+    STOCK_HOLD_MINUTES, replacing any earlier holds of that key.
+
+    All or nothing: returns an empty dict on success, or
+    {product_id: units still available} for the products that could not be
+    held, in which case the earlier holds of ``hold_key`` are left as they were.
+    """
+    quantities = {int(pk): qty for pk, qty in quantities.items() if qty > 0}
+    now = timezone.now()
+    expires_at = now + hold_duration()
+    if not quantities:
+        release(hold_key)
+        return {}
+
+    with transaction.atomic():
+        # Starting with a write takes SQLite's write lock before anything is
+        # read, so the availability check below sees every committed hold.
+        StockHold.objects.filter(hold_key=hold_key).delete()
+        if connection.features.has_select_for_update:
+            # Row locks serialize concurrent checkouts on other databases
+            list(Product.objects.select_for_update().filter(pk__in=quantities).values_list('pk'))
+
+        adapt = connection.ops.adapt_datetimefield_value
+        wanted = ', '.join(['(%s, %s)'] * len(quantities))
+        params = [value for item in quantities.items() for value in item]
+        table, product_table = StockHold._meta.db_table, Product._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH wanted (product_id, quantity) AS (VALUES {wanted}) "
+                f"INSERT INTO {table} (product_id, hold_key, quantity, expires_at, created_at) "
+                f"SELECT w.product_id, %s, w.quantity, %s, %s "
+                f"FROM wanted w JOIN {product_table} p ON p.id = w.product_id "
+                f"WHERE p.stock - COALESCE((SELECT SUM(h.quantity) FROM {table} h "
+                f"  WHERE h.product_id = p.id AND h.expires_at > %s), 0) >= w.quantity",
+                params + [hold_key, adapt(expires_at), adapt(now), adapt(now)],
+            )
+        # Read back what was inserted: sqlite3 reports a rowcount of -1 for
+        # an INSERT behind a WITH clause. The key's older holds are gone.
+        held = set(StockHold.objects.filter(hold_key=hold_key).values_list('product_id', flat=True))
+        if len(held) == len(quantities):
+            return {}
+        transaction.set_rollback(True)
+
+    available = available_to_sell(quantities, hold_key)
+    # Never empty on failure: the products that could not be held, whatever
+    # their availability after the rollback
+    return {pk: available.get(pk, 0) for pk in quantities if pk not in held}
+
+
+def release(hold_key):
+    StockHold.objects.filter(hold_key=hold_key).delete()
+
+
+def expire_holds(now=None):
+    """Delete every hold that has run out; returns how many were removed."""
+    deleted, _ = StockHold.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+def can_sell_q(wanted, hold_key=None):
+    """Filter for products whose stock, less other shoppers' holds, covers ``wanted``."""
+    return Q(stock__gte=wanted + held_by_others(hold_key))
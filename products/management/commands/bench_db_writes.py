@@ -0,0 +1,117 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from toystore.db import sqlite_config
+
+ALIAS = 'bench'
+COUNTER_ROWS = 100
+
+
+def _prepare(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE bench_session (key TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL);"
+        "CREATE TABLE bench_counter (id INTEGER PRIMARY KEY, n INTEGER NOT NULL);"
+    )
+    conn.executemany("INSERT INTO bench_counter VALUES (?, 0)", [(i,) for i in range(1, COUNTER_ROWS + 1)])
+    conn.commit()
+    conn.close()
+
+
+def _worker(config, start_at, seconds, reads, results):
+    """One gunicorn-like worker: requests that read, then read-modify-write in a transaction."""
+    # Register the scratch database next to the real ones, for transaction.atomic()
+    connections.settings[ALIAS] = connections.configure_settings({'default': {}, ALIAS: config})[ALIAS]
+    conn = connections[ALIAS]
+    rnd = random.Random(os.getpid())
+    committed, failed, latencies = 0, 0, []
+
+    time.sleep(max(start_at - time.time(), 0))
+    end = start_at + seconds
+    while time.time() < end:
+        began = time.perf_counter()
+        try:
+            with conn.cursor() as cursor:
+                for _ in range(reads):
+                    cursor.execute("SELECT SUM(n) FROM bench_counter WHERE id <= %s", [rnd.randint(1, COUNTER_ROWS)])
+                    cursor.fetchone()
+            # Like a cart update or order: read a row, then write it and the session
+            with transaction.atomic(using=ALIAS), conn.cursor() as cursor:
+                row_id = rnd.randint(1, COUNTER_ROWS)
+                cursor.execute("SELECT n FROM bench_counter WHERE id = %s", [row_id])
+                cursor.fetchone()
+                cursor.execute("UPDATE bench_counter SET n = n + 1 WHERE id = %s", [row_id])
+                cursor.execute(
+                    "INSERT INTO bench_session VALUES (%s, %s, %s) ON CONFLICT(key) DO UPDATE SET "
+                    "data = excluded.data, expires = excluded.expires",
+                    [f'session-{rnd.randint(1, 1000)}', 'x' * 200, time.time() + 3600],
+                )
+            committed += 1
+            latencies.append(time.perf_counter() - began)
+        except OperationalError:
+            failed += 1
+        # What Django does at the end of every request
+        conn.close_if_unusable_or_obsolete()
+    conn.close()
+    results.put((committed, failed, latencies))
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent write benchmark on a scratch SQLite file: several worker "
+        "processes run read-then-write requests, first with Django's default "
+        "SQLite settings, then with toystore.db.sqlite3 (WAL, pragmas, "
+        "BEGIN IMMEDIATE, persistent connections, lock retries)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--reads', type=int, default=3, help="Reads per request before the write.")
+
+    def handle(self, *args, **options):
+        setups = [
+            ('default', lambda path: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}),
+            ('tuned', lambda path: sqlite_config(path)),
+        ]
+        # Children must not inherit an open connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+
+        self.stdout.write(f"{options['workers']} workers, {options['seconds']:g}s each")
+        self.stdout.write(f"{'config':<10}{'commits/s':>11}{'failed':>9}{'p50 ms':>9}{'p95 ms':>9}")
+        for label, make_config in setups:
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                _prepare(path)
+                results = context.Queue()
+                start_at = time.time() + 0.5
+                workers = [
+                    context.Process(target=_worker, args=(
+                        make_config(path), start_at, options['seconds'], options['reads'], results,
+                    ))
+                    for _ in range(options['workers'])
+                ]
+                for worker in workers:
+                    worker.start()
+                # A worker that died would otherwise block this forever
+                outcomes = [results.get(timeout=options['seconds'] + 60) for _ in workers]
+                for worker in workers:
+                    worker.join()
+
+            committed = sum(o[0] for o in outcomes)
+            failed = sum(o[1] for o in outcomes)
+            latencies = sorted(l for o in outcomes for l in o[2])
+            p50 = statistics.median(latencies) * 1000 if latencies else 0
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+            self.stdout.write(
+                f"{label:<10}{committed / options['seconds']:>11.0f}{failed:>9}{p50:>9.1f}{p95:>9.1f}"
+            )
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+
+from products.models import Product
+
+SERVERS = {
+    # Sync workers: one request at a time per process
+    'wsgi': ('toystore.wsgi:application', [], 'False'),
+    # One event loop per process, async views
+    'asgi': ('toystore.asgi:application', ['-k', 'uvicorn_worker.UvicornWorker'], 'True'),
+}
+SAMPLE_PRODUCTS = 200
+# Share of requests per kind of page
+MIX = {'home': 0.1, 'listing': 0.3, 'detail': 0.6}
+STARTUP_TIMEOUT = 30
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _get(port, path):
+    """One request on a fresh connection, as sync gunicorn workers close every connection."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        # The body is read to the end, like a browser would
+        while await reader.read(65536):
+            pass
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def _load(port, paths, connections_count, warmup, seconds, seed):
+    rnd = random.Random(seed)
+    kinds, weights = zip(*MIX.items())
+    measure_from = time.monotonic() + warmup
+    end = measure_from + seconds
+    latencies, errors = [], 0
+
+    async def client():
+        nonlocal errors
+        while True:
+            started = time.monotonic()
+            if started >= end:
+                return
+            try:
+                status = await _get(port, rnd.choice(paths[rnd.choices(kinds, weights)[0]]))
+                failed = status >= 400
+            except (OSError, ValueError, IndexError):
+                failed = True
+            if started >= measure_from:
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(time.monotonic() - started)
+
+    await asyncio.gather(*(client() for _ in range(connections_count)))
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Start the site under gunicorn twice, with sync WSGI workers and with "
+        "uvicorn ASGI workers (async views), put the same concurrent load of "
+        "anonymous page views on each and report throughput and latency. Run "
+        "it on a generate_store database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('servers', nargs='*', help=f"Only run these: {', '.join(SERVERS)}.")
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes per server.")
+        parser.add_argument('--connections', type=int, default=64, help="Concurrent clients.")
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--warmup', type=float, default=2, help="Unmeasured load first.")
+        parser.add_argument('--seed', type=int, default=42, help="Picks the products requested.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['servers']) - set(SERVERS)
+        if unknown:
+            raise CommandError(f"Unknown servers: {', '.join(sorted(unknown))}")
+        paths = self._paths(options['seed'])
+        # The servers open their own connections
+        connections.close_all()
+
+        self.stdout.write(
+            f"{options['workers']} workers, {options['connections']} connections, "
+            f"{options['seconds']:g}s over {sum(map(len, paths.values()))} paths"
+        )
+        self.stdout.write(f"{'server':<8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+        for name in options['servers'] or SERVERS:
+            # Both start cold: nothing cached by the previous run
+            cache.clear()
+            port = _free_port()
+            with tempfile.TemporaryFile() as log:
+                server = self._start(name, port, options['workers'], log)
+                try:
+                    latencies, errors = asyncio.run(_load(
+                        port, paths, options['connections'], options['warmup'],
+                        options['seconds'], options['seed'],
+                    ))
+                finally:
+                    server.terminate()
+                    try:
+                        server.wait(timeout=30)
+                    except subprocess.TimeoutExpired:
+                        server.kill()
+            if len(latencies) < 2:
+                raise CommandError(f"{name}: {len(latencies)} successful requests, {errors} errors.")
+            cuts = statistics.quantiles([l * 1000 for l in latencies], n=100, method='inclusive')
+            self.stdout.write(
+                f"{name:<8}{len(latencies) / options['seconds']:>9.0f}{cuts[49]:>9.1f}"
+                f"{cuts[94]:>9.1f}{cuts[98]:>9.1f}{errors:>8}"
+            )
+
+    def _paths(self, seed):
+        products = list(Product.objects.filter(available=True).order_by('pk').values_list('pk', 'slug'))
+        if not products:
+            raise CommandError("No products to request; run generate_store first.")
+        sample = random.Random(seed).sample(products, min(SAMPLE_PRODUCTS, len(products)))
+        listing = reverse('products:list')
+        return {
+            'home': [reverse('home')],
+            'listing': [listing, f'{listing}?in_stock=on', f"{reverse('products:search')}?query=robot"],
+            'detail': [reverse('products:detail_with_slug', args=[pk, slug]) for pk, slug in sample],
+        }
+
+    def _start(self, name, port, workers, log):
+        app, worker_args, async_views = SERVERS[name]
+        env = {**os.environ, 'ASYNC_VIEWS': async_views}
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', app, *worker_args, '--workers', str(workers),
+             '--bind', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                break
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    return server
+            except OSError:
+                time.sleep(0.2)
+        server.kill()
+        log.seek(0)
+        raise CommandError(f"{name} server did not start:\n{log.read().decode(errors='replace')[-2000:]}")
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Count products bought together in orders placed since the last run "
+        "and refresh the precomputed recommendations. Run from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Discard the counts and recount every order.")
+        parser.add_argument('--window', type=int, default=recommendations.ORDERS_PER_WINDOW,
+                            help="Orders read per query.")
+        parser.add_argument('--max-pairs', type=int, default=recommendations.MAX_PAIRS,
+                            help="Pairs counted in memory before they are written out.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        run = recommendations.build(
+            full=options['full'],
+            window_size=options['window'],
+            max_pairs=options['max_pairs'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {run.orders_processed} new orders (up to #{run.last_order_id}) "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
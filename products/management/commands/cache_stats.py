@@ -0,0 +1,25 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Show per-tier hit rates of the two-tier cache, summed over all workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help="Cache alias to inspect.")
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not hasattr(cache, 'shared_stats'):
+            self.stdout.write(self.style.WARNING(
+                f"Cache '{options['alias']}' is not a TwoTierCache; no tier stats available."
+            ))
+            return
+        stats = cache.shared_stats()
+        self.stdout.write(f"Workers reporting: {stats['workers']}")
+        for tier in ('l1', 'l2'):
+            hits, misses = stats[f'{tier}_hits'], stats[f'{tier}_misses']
+            self.stdout.write(
+                f"{tier.upper()}: {hits} hits / {misses} misses "
+                f"({stats[f'{tier}_hit_rate']:.1%} hit rate)"
+            )
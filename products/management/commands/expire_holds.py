@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from products.inventory import expire_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stock holds whose time is up. Expired holds already stop "
+        "counting against stock; this only keeps the table small. Run from cron."
+    )
+
+    def handle(self, *args, **options):
+        deleted = expire_holds()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired holds."))
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import export_rows, guess_format, write_rows
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Write the catalog as CSV or JSON Lines, in the format import_catalog reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="File to write, or - for stdout (default).")
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help="Defaults to the file extension, else CSV.")
+        parser.add_argument('--category', help="Only this category (slug).")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        products = Product.objects.all()
+        if options['category']:
+            products = products.filter(category__slug=options['category'])
+
+        started = time.monotonic()
+        try:
+            stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as exc:
+            raise CommandError(exc)
+        try:
+            written = write_rows(export_rows(products), stream, fmt)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        if path != '-':
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Exported {written} products to {path} in {elapsed:.1f}s "
+                f"({written / elapsed if elapsed else written:.0f} rows/s)"
+            ))
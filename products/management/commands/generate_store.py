@@ -0,0 +1,195 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from cart.quote import CartQuote
+from orders.models import Order, OrderItem
+from products import search
+from products.facets import invalidate_facets
+from products.models import Category, Product
+
+# Everything generated is recognisable by these, so --flush removes only it
+SKU_PREFIX = 'SYN-'
+USERNAME_PREFIX = 'synthetic-'
+PASSWORD = 'synthetic'
+
+ADJECTIVES = (
+    'Wooden', 'Plush', 'Magnetic', 'Remote Control', 'Glow-in-the-Dark', 'Musical', 'Giant',
+    'Mini', 'Classic', 'Electric', 'Soft', 'Stacking', 'Rainbow', 'Puzzle', 'Racing', 'Talking',
+)
+NOUNS = (
+    'Train', 'Teddy Bear', 'Robot', 'Dinosaur', 'Car', 'Doll House', 'Kite', 'Drum', 'Blocks',
+    'Rocket', 'Unicorn', 'Pirate Ship', 'Tractor', 'Castle', 'Helicopter', 'Xylophone',
+)
+THEMES = (
+    'Wooden Toys', 'Soft Toys', 'Building Sets', 'Vehicles', 'Dolls', 'Board Games', 'Puzzles',
+    'Outdoor Play', 'Musical Toys', 'Science Kits', 'Arts and Crafts', 'Baby Toys',
+    'Action Figures', 'Ride-ons', 'Pretend Play', 'Electronic Toys',
+)
+PHRASES = (
+    'Safe for ages three and up.', 'Made from sustainably sourced materials.',
+    'Batteries included.', 'A favourite for birthdays.', 'Encourages creative play.',
+    'Easy to clean.', 'Comes gift-wrapped.', 'Builds fine motor skills.',
+)
+# (slab, weight): most toys sit in the 12% and 18% slabs
+GST_WEIGHTS = ((5, 1), (12, 4), (18, 4), (28, 1))
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a deterministic synthetic store for load tests: "
+        "categories, products, users and orders, written with bulk inserts. The "
+        "same --seed gives the same catalog and order mix. Refuses to add to "
+        "earlier synthetic data unless --flush removes it first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--categories', type=int, default=40)
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--users', type=int, default=5_000)
+        parser.add_argument('--orders', type=int, default=300_000)
+        parser.add_argument('--items-per-order', type=float, default=6,
+                            help="Average lines per order (at least one each).")
+        parser.add_argument('--batch-size', type=int, default=5_000, help="Rows per bulk insert and transaction.")
+        parser.add_argument('--flush', action='store_true', help="Delete earlier synthetic data first.")
+
+    def handle(self, *args, **options):
+        if options['products'] < 1 or options['categories'] < 1 or options['items_per_order'] < 1:
+            raise CommandError("Need at least one category, one product and one item per order.")
+        if options['orders'] and options['users'] < 1:
+            raise CommandError("Orders need at least one user.")
+        if options['flush']:
+            self._timed("Removed earlier synthetic data", self._flush)
+        elif Product.objects.filter(sku__startswith=SKU_PREFIX).exists():
+            raise CommandError("Synthetic data already exists; rerun with --flush to replace it.")
+
+        self.rnd = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        category_ids = self._timed(f"{options['categories']:,} categories", self._categories, options['categories'])
+        products = self._timed(f"{options['products']:,} products", self._products, options['products'], category_ids)
+        user_ids = self._timed(f"{options['users']:,} users", self._users, options['users'])
+        items = self._timed(f"{options['orders']:,} orders", self._orders,
+                            options['orders'], options['items_per_order'], products, user_ids)
+        self.stdout.write(f"  with {items:,} order items")
+        self._timed("Search index", search.rebuild_index)
+
+        # Bulk inserts send no signals: nothing cached describes the new catalog
+        cache.clear()
+        invalidate_facets()
+        self.stdout.write(self.style.SUCCESS(
+            "Synthetic store ready. Run build_recommendations for related products; "
+            f"users log in as {USERNAME_PREFIX}<n> / {PASSWORD}."
+        ))
+
+    def _timed(self, label, function, *args):
+        started = time.monotonic()
+        result = function(*args)
+        self.stdout.write(f"{label} in {time.monotonic() - started:.1f}s")
+        return result
+
+    def _batches(self, rows):
+        for start in range(0, len(rows), self.batch_size):
+            yield rows[start:start + self.batch_size]
+
+    def _flush(self):
+        OrderItem.objects.filter(order__user__username__startswith=USERNAME_PREFIX).delete()
+        OrderItem.objects.filter(product__sku__startswith=SKU_PREFIX).delete()
+        Order.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        Product.objects.filter(sku__startswith=SKU_PREFIX).delete()
+        Category.objects.filter(slug__startswith='synthetic-').delete()
+
+    def _categories(self, count):
+        names = [f'{THEMES[i % len(THEMES)]} {i // len(THEMES) + 1}' for i in range(count)]
+        Category.objects.bulk_create([Category(name=f'Synthetic {name}', slug=f'synthetic-{i}')
+                                      for i, name in enumerate(names)])
+        return list(Category.objects.filter(slug__startswith='synthetic-').values_list('pk', flat=True))
+
+    def _products(self, count, category_ids):
+        """Return [(pk, price, gst slab)] for the order generator."""
+        rnd = self.rnd
+        slabs, weights = zip(*GST_WEIGHTS)
+        rows = []
+        for i in range(count):
+            name = f'{rnd.choice(ADJECTIVES)} {rnd.choice(NOUNS)} {i + 1}'
+            rows.append(Product(
+                sku=f'{SKU_PREFIX}{i + 1:07d}',
+                name=name,
+                slug=f'synthetic-{i + 1}',
+                category_id=rnd.choice(category_ids),
+                description=' '.join(rnd.sample(PHRASES, 3)),
+                price=Decimal(rnd.randint(99, 9999)) - Decimal('0.01'),
+                gst_rate=rnd.choices(slabs, weights)[0],
+                # One in twenty sold out, a few unlisted, one percent featured
+                stock=0 if rnd.random() < 0.05 else rnd.randint(1, 500),
+                available=rnd.random() >= 0.03,
+                is_featured=rnd.random() < 0.01,
+            ))
+        for batch in self._batches(rows):
+            with transaction.atomic():
+                Product.objects.bulk_create(batch)
+        return list(Product.objects.filter(sku__startswith=SKU_PREFIX).order_by('sku')
+                    .values_list('pk', 'price', 'gst_rate'))
+
+    def _users(self, count):
+        # Hashing once keeps this fast; every synthetic user shares the password
+        password = make_password(PASSWORD)
+        users = [User(username=f'{USERNAME_PREFIX}{i + 1}', email=f'{USERNAME_PREFIX}{i + 1}@example.com',
+                      first_name='Synthetic', last_name=f'Shopper {i + 1}', password=password)
+                 for i in range(count)]
+        for batch in self._batches(users):
+            User.objects.bulk_create(batch)
+        return list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk')
+                    .values_list('pk', flat=True))
+
+    def _orders(self, count, items_per_order, products, user_ids):
+        """
+        Skewed like a real shop: a few users order often, a few products sell
+        most. Returns the number of order items written.
+        """
+        rnd = self.rnd
+        # Exponential beyond the first line, so the mean is items_per_order
+        extra_lines = 1 / (items_per_order - 1) if items_per_order > 1 else None
+        total_items = 0
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            orders, baskets = [], []
+            for _ in range(size):
+                user_index = int(len(user_ids) * rnd.random() ** 2)
+                lines = min(1 + round(rnd.expovariate(extra_lines)) if extra_lines else 1, 30)
+                picked = {int(len(products) * rnd.random() ** 3) for _ in range(lines)}
+                basket = [(products[i], rnd.choice((1, 1, 1, 2, 3))) for i in sorted(picked)]
+                quote = CartQuote([(price, quantity, slab) for (_, price, slab), quantity in basket])
+                orders.append(Order(
+                    user_id=user_ids[user_index],
+                    full_name=f'Synthetic Shopper {user_index + 1}',
+                    email=f'{USERNAME_PREFIX}{user_index + 1}@example.com',
+                    address=f'{rnd.randint(1, 999)} Synthetic Street',
+                    phone=f'98{rnd.randint(10_000_000, 99_999_999)}',
+                    paid=rnd.random() < 0.9,
+                    subtotal=quote.subtotal,
+                    tax_amount=quote.total_tax,
+                    total=quote.grand_total,
+                    item_count=len(basket),
+                ))
+                baskets.append(basket)
+            with transaction.atomic():
+                Order.objects.bulk_create(orders)
+                items = [
+                    OrderItem(order_id=order.pk, product_id=pk, price=price, quantity=quantity)
+                    for order, basket in zip(orders, baskets)
+                    for (pk, price, _), quantity in basket
+                ]
+                OrderItem.objects.bulk_create(items)
+            total_items += len(items)
+            if self.verbosity > 1:
+                self.stdout.write(f"  {start + size:,} orders, {total_items:,} items")
+        return total_items
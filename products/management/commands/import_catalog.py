@@ -0,0 +1,50 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import CHUNK_SIZE, CatalogImporter, guess_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update products from a CSV or JSON Lines feed, matched on SKU. "
+        "Columns: sku, name, category, description, price, gst_rate, stock, "
+        "available, is_featured. Missing categories are created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to read, or - for stdin.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        importer = CatalogImporter(chunk_size=options['chunk_size'])
+        started = time.monotonic()
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            rows = read_rows(stream, fmt)
+            for chunk in importer.chunks(rows):
+                importer.import_chunk(chunk)
+                if options['verbosity'] > 1:
+                    self._progress(importer, started)
+        elapsed = time.monotonic() - started
+
+        for number, error in importer.errors[:20]:
+            self.stderr.write(f"Line {number}: {error}")
+        if len(importer.errors) > 20:
+            self.stderr.write(f"... and {len(importer.errors) - 20} more")
+        total = importer.created + importer.updated
+        self.stdout.write(self.style.SUCCESS(
+            f"{importer.created} created, {importer.updated} updated, {importer.skipped} skipped "
+            f"in {elapsed:.1f}s ({total / elapsed if elapsed else total:.0f} rows/s)"
+        ))
+
+    def _progress(self, importer, started):
+        done = importer.created + importer.updated + importer.skipped
+        self.stdout.write(f"  {done} rows, {done / (time.monotonic() - started):.0f} rows/s")
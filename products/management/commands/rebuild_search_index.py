@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from products import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text product search index. Run this after bulk "
+        "changes that bypass model signals (queryset.update, raw SQL, loaddata)."
+    )
+
+    def handle(self, *args, **options):
+        if not search.fts_enabled():
+            self.stdout.write(self.style.WARNING(
+                "Full-text index is only available on SQLite; nothing to do."
+            ))
+            return
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products."))
@@ -0,0 +1,221 @@
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment, \
+    teardown_test_environment
+from django.urls import reverse
+
+from orders.models import Order
+from products.models import Product
+from products.page_cache import invalidate_pages
+from products.pagination import MAX_NUMBERED_PAGES, encode_cursor
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+# Listing position of the "deep page" scenario's cursor
+DEEP_PAGE_OFFSET = 5_000
+SAMPLE_PRODUCTS = 200
+CHECKOUT_FORM = {
+    'full_name': 'Benchmark Shopper', 'email': 'bench@example.com',
+    'address': '1 Benchmark Road', 'phone': '9876543210',
+}
+
+
+class Scenario:
+    """
+    One page to time. ``request(client, product)`` makes the timed request;
+    ``prepare``, if given, runs first and is not timed (filling a cart, ...).
+
+    Cached pages and template fragments are retired before every request, so
+    the view and its queries run; ``cached`` scenarios time the cache hits.
+    """
+
+    def __init__(self, name, request, prepare=None, logged_in=False, cached=False):
+        self.name = name
+        self.request = request
+        self.prepare = prepare
+        self.logged_in = logged_in
+        self.cached = cached
+
+
+def _add_to_cart(client, product):
+    client.get(reverse('cart:add', args=[product.pk]))
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the storefront pages through the Django test client and report "
+        "p50/p95/p99 latency and queries per request. Compares against a stored "
+        "baseline and fails when a page got slower or runs more queries. Run it "
+        "on a generate_store database; everything it writes (carts, orders) is "
+        "rolled back, and it uses a private in-memory cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help="Only run these scenarios.")
+        parser.add_argument('--iterations', type=int, default=30, help="Timed requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per scenario first.")
+        parser.add_argument('--seed', type=int, default=42, help="Picks the products requested.")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Store this run as the baseline instead of comparing against it.")
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed p95 slowdown as a fraction of the baseline.")
+        parser.add_argument('--slack-ms', type=float, default=5.0,
+                            help="Allowed p95 slowdown in ms on top of --tolerance, for noise on fast pages.")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError("Percentiles need at least two iterations.")
+        products = list(
+            Product.objects.filter(available=True, stock__gt=0, category__isnull=False).order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        if not products:
+            raise CommandError("No products in stock to request; run generate_store first.")
+
+        scenarios = self._scenarios()
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {s.name for s in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [s for s in scenarios if s.name in options['scenarios']]
+
+        rnd = random.Random(options['seed'])
+        sample = Product.objects.select_related('category').in_bulk(rnd.sample(products, min(SAMPLE_PRODUCTS, len(products))))
+        sample = [sample[pk] for pk in sorted(sample)]
+        catalog = {'products': Product.objects.count(), 'orders': Order.objects.count()}
+
+        results = {}
+        setup_test_environment()
+        private_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                     'LOCATION': 'run-benchmark'}}
+        try:
+            self.stdout.write(f"{'scenario':<34}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}")
+            with override_settings(CACHES=private_cache), transaction.atomic():
+                shopper = self._shopper()
+                for scenario in scenarios:
+                    results[scenario.name] = self._run(scenario, shopper, sample, rnd, options)
+                    self._report_line(scenario.name, results[scenario.name])
+                transaction.set_rollback(True)
+        finally:
+            teardown_test_environment()
+
+        path = Path(options['baseline'])
+        if options['save_baseline']:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({
+                'catalog': catalog, 'iterations': options['iterations'], 'scenarios': results,
+            }, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {path}"))
+            return
+        if not path.exists():
+            self.stdout.write(f"No baseline at {path}; rerun with --save-baseline to store one.")
+            return
+        self._compare(json.loads(path.read_text()), catalog, results, options)
+
+    def _scenarios(self):
+        deep = (Product.objects.filter(available=True).order_by('-created_at', '-id')
+                .values_list('created_at', 'pk')[DEEP_PAGE_OFFSET:DEEP_PAGE_OFFSET + 1])
+        deep = next(iter(deep), None) or (Product.objects.filter(available=True)
+                                          .values_list('created_at', 'pk').last())
+        deep_cursor = encode_cursor(deep[0], deep[1], 'next')
+        product_list = reverse('products:list')
+
+        def get(url):
+            return lambda client, product: client.get(url)
+
+        return [
+            Scenario('home', get(reverse('home'))),
+            Scenario('product_list', get(product_list)),
+            Scenario('product_list_search', get(reverse('products:search') + '?query=robot')),
+            Scenario('product_list_filters', get(product_list + '?min_price=500&max_price=2000&in_stock=on')),
+            Scenario('product_list_last_numbered_page', get(product_list + f'?page={MAX_NUMBERED_PAGES}')),
+            Scenario('product_list_deep_cursor', get(product_list + f'?cursor={deep_cursor}')),
+            Scenario('category', lambda client, product: client.get(
+                reverse('products:by_category', args=[product.category.slug]))),
+            Scenario('product_detail', lambda client, product: client.get(product.get_absolute_url())),
+            Scenario('cart_add', lambda client, product: client.get(reverse('cart:add', args=[product.pk]))),
+            Scenario('cart_remove', lambda client, product: client.get(
+                reverse('cart:remove_from_cart', args=[product.pk])), prepare=_add_to_cart),
+            Scenario('checkout', lambda client, product: client.post(reverse('orders:checkout'), CHECKOUT_FORM),
+                     prepare=_add_to_cart, logged_in=True),
+            Scenario('order_history', get(reverse('orders:history')), logged_in=True),
+            # Anonymous page cache hits, after the warmup requests filled it
+            Scenario('home_cached', get(reverse('home')), cached=True),
+            Scenario('product_list_cached', get(product_list), cached=True),
+        ]
+
+    def _shopper(self):
+        """The user with the most orders, so order_history pages through real data."""
+        busiest = (Order.objects.filter(user__isnull=False).values('user')
+                   .annotate(orders=Count('pk')).order_by('-orders').first())
+        if busiest:
+            return User.objects.get(pk=busiest['user'])
+        # Created inside the rolled-back transaction
+        return User.objects.create_user('benchmark-shopper', 'bench@example.com')
+
+    def _run(self, scenario, shopper, sample, rnd, options):
+        client = Client()
+        if scenario.logged_in:
+            client.force_login(shopper)
+        latencies, queries = [], []
+        for i in range(options['warmup'] + options['iterations']):
+            product = rnd.choice(sample)
+            if scenario.prepare:
+                scenario.prepare(client, product)
+            if not scenario.cached:
+                invalidate_pages()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = scenario.request(client, product)
+                elapsed = time.perf_counter() - started
+            if response.status_code not in (200, 302):
+                raise CommandError(f"{scenario.name}: {response.status_code} from {response.request['PATH_INFO']}")
+            if i >= options['warmup']:
+                latencies.append(elapsed * 1000)
+                queries.append(len(captured))
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'p50_ms': round(cuts[49], 2),
+            'p95_ms': round(cuts[94], 2),
+            'p99_ms': round(cuts[98], 2),
+            # The most any request needed: a steady number, unlike the timings
+            'queries': max(queries),
+        }
+
+    def _report_line(self, name, result):
+        self.stdout.write(
+            f"{name:<34}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+            f"{result['p99_ms']:>9.1f}{result['queries']:>9}"
+        )
+
+    def _compare(self, baseline, catalog, results, options):
+        if baseline.get('catalog') != catalog:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was measured on {baseline.get('catalog')}, this database has {catalog}."
+            ))
+        regressions = []
+        for name, result in results.items():
+            before = baseline['scenarios'].get(name)
+            if before is None:
+                self.stdout.write(f"{name}: not in the baseline")
+                continue
+            allowed = before['p95_ms'] * (1 + options['tolerance']) + options['slack_ms']
+            if result['p95_ms'] > allowed:
+                regressions.append(f"{name}: p95 {result['p95_ms']:.1f} ms, baseline {before['p95_ms']:.1f} ms")
+            if result['queries'] > before['queries']:
+                regressions.append(f"{name}: {result['queries']} queries, baseline {before['queries']}")
+        if regressions:
+            for line in regressions:
+                self.stderr.write(line)
+            raise CommandError(f"{len(regressions)} regressions against {options['baseline']}.")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
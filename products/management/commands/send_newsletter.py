@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.template import TemplateDoesNotExist
+
+from products import newsletter
+from products.models import NewsletterCampaign
+
+
+class Command(BaseCommand):
+    help = (
+        "Mail a newsletter campaign to every subscriber it has not reached yet, "
+        "over one SMTP connection and at most --rate messages per second. "
+        "Running it again for the same campaign resumes an interrupted send."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign', help="Campaign name (slug); created on first use.")
+        parser.add_argument('--subject', help="Required for a new campaign.")
+        parser.add_argument('--template', help="Template base name, rendered as <name>.html and <name>.txt.")
+        parser.add_argument('--batch-size', type=int, default=newsletter.BATCH_SIZE,
+                            help="Subscribers read and recorded at a time.")
+        parser.add_argument('--rate', type=float, help="Messages per second, 0 for no limit "
+                                                       "(default: NEWSLETTER_SEND_RATE).")
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Also mail subscribers whose earlier delivery was refused.")
+
+    def handle(self, *args, **options):
+        campaign = NewsletterCampaign.objects.filter(name=options['campaign']).first()
+        if campaign is None:
+            if not options['subject']:
+                raise CommandError("A new campaign needs --subject.")
+            campaign = NewsletterCampaign(name=options['campaign'], subject=options['subject'])
+            if options['template']:
+                campaign.template = options['template']
+            campaign.save()
+        elif options['subject'] or options['template']:
+            raise CommandError(f"Campaign {campaign.name} already exists; its subject and template are fixed.")
+
+        def progress(sent, failed):
+            self.stdout.write(f"{sent} sent, {failed} failed ({time.monotonic() - started:.0f}s)")
+
+        started = time.monotonic()
+        try:
+            sent, failed = newsletter.send_campaign(
+                campaign, batch_size=options['batch_size'], rate=options['rate'],
+                retry_failed=options['retry_failed'], progress=progress if options['verbosity'] > 1 else None,
+            )
+        except TemplateDoesNotExist as exc:
+            raise CommandError(f"No template {exc}")
+        except OSError as exc:
+            raise CommandError(f"Mail server connection failed: {exc}. Run again to resume.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Campaign {campaign.name}: {sent} sent, {failed} refused in {time.monotonic() - started:.1f}s"
+        ))
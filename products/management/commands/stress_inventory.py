@@ -0,0 +1,108 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from orders.models import Order
+from orders.services import InsufficientStock, place_order
+from products.inventory import release, reserve
+from products.models import Category, Product, StockHold
+
+
+class Command(BaseCommand):
+    help = (
+        "Stress-test stock holds: many parallel buyers race through "
+        "reserve + place_order for one low-stock product, then the command "
+        "checks nothing was oversold. Creates and removes its own category "
+        "and product; needs a file-backed database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=40)
+        parser.add_argument('--stock', type=int, default=5)
+        parser.add_argument('--quantity', type=int, default=1, help="Units each buyer wants.")
+
+    def handle(self, *args, **options):
+        buyers, stock, quantity = options['buyers'], options['stock'], options['quantity']
+        category, _ = Category.objects.get_or_create(slug='stress-test', defaults={'name': 'Stress test'})
+        product = Product.objects.create(
+            name='Stress test product', slug=f'stress-test-{int(time.time() * 1000)}',
+            category=category, description='Temporary', price=Decimal('10.00'),
+            stock=stock, available=False,
+        )
+        try:
+            results, elapsed = self._race(product, buyers, quantity)
+            product.refresh_from_db()
+            orders = list(Order.objects.filter(items__product=product))
+            sold_units = sum(order.items.get().quantity for order in orders)
+        finally:
+            # Buyers commit for real, so the test data is removed by hand;
+            # the category goes too unless something else has joined it
+            Order.objects.filter(items__product=product).delete()
+            product.delete()
+            if not Product.objects.filter(category=category).exists():
+                category.delete()
+
+        self.stdout.write(
+            f"{buyers} buyers in {elapsed:.2f}s: {results['held']} held stock, {results['sold']} sold, "
+            f"{results['no_hold']} could not hold, {results['short']} short at placement, "
+            f"{results['locked']} gave up on a locked database"
+        )
+        self.stdout.write(f"Stock {stock} -> {product.stock}, {sold_units} units in {len(orders)} orders")
+
+        expected = min(stock // quantity, buyers) * quantity
+        ok = product.stock >= 0 and sold_units + product.stock == stock and (
+            results['locked'] or sold_units == expected
+        )
+        # Every successful reserve() must leave a hold, and a buyer holding
+        # stock must never find it gone when placing the order
+        holds_ok = (results['held'] == results['reserved'] and not results['short']
+                    and (results['held'] or stock < quantity or results['locked']))
+        if not ok:
+            raise CommandError("Inventory invariant violated: oversold or lost stock.")
+        if not holds_ok:
+            raise CommandError(
+                f"Stock holds not honoured: {results['reserved']} reserved, {results['held']} held, "
+                f"{results['short']} short at placement."
+            )
+        self.stdout.write(self.style.SUCCESS("No overselling."))
+
+    def _race(self, product, buyers, quantity):
+        """Run ``buyers`` threads at once; returns (outcome counts, elapsed seconds)."""
+        results = {'sold': 0, 'no_hold': 0, 'short': 0, 'locked': 0, 'reserved': 0, 'held': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(buyers)
+
+        def buyer(index):
+            hold_key = f'stress-{product.pk}-{index}'
+            outcome, reserved, held = 'no_hold', False, False
+            try:
+                start.wait()
+                if not reserve(hold_key, {product.pk: quantity}):
+                    reserved = True
+                    held = StockHold.objects.filter(hold_key=hold_key, product=product, quantity=quantity).exists()
+                    order = Order(full_name='Stress', email='stress@example.com', address='-', phone='0')
+                    place_order(order, [{'product': product, 'price': product.price, 'quantity': quantity}], hold_key)
+                    outcome = 'sold'
+            except InsufficientStock:
+                outcome = 'short'
+            except OperationalError:
+                outcome = 'locked'
+            finally:
+                release(hold_key)
+                connection.close()
+                with lock:
+                    results[outcome] += 1
+                    results['reserved'] += reserved
+                    results['held'] += held
+
+        threads = [threading.Thread(target=buyer, args=(i,)) for i in range(buyers)]
+        began = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - began
+        return results, elapsed
@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products import catalog_cache, images
+from products.models import Product
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connections
+    connections.close_all()
+
+
+def _warm(pk, force):
+    product = Product.objects.filter(pk=pk).first()
+    if product is None or not product.image:
+        return pk, 'skipped'
+    if force:
+        product.image_variants = {}
+    try:
+        images.refresh_variants(product)
+    except Exception as exc:
+        # A corrupt or oversized upload (UnidentifiedImageError,
+        # DecompressionBombError, ...) fails its own product, not the run
+        return pk, f'failed: {type(exc).__name__}: {exc}'
+    return pk, 'ok'
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate missing image variants (srcset sizes and admin thumbnails) "
+        "for every product, in parallel. Safe to interrupt: each product is "
+        "committed as it finishes and re-runs skip the ones already done."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Worker processes (default: CPU count).")
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help="Products looked up per query.")
+        parser.add_argument('--force', action='store_true',
+                            help="Regenerate variants even when they are current.")
+
+    def handle(self, *args, **options):
+        force = options['force']
+        pending = self._pending_ids(options['batch_size'], force)
+        total = len(pending)
+        if not total:
+            self.stdout.write(self.style.SUCCESS("All product images are up to date."))
+            return
+
+        self.stdout.write(f"Generating variants for {total} products...")
+        started = time.monotonic()
+        done = failed = 0
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_warm, pk, force) for pk in pending]
+            for future in as_completed(futures):
+                pk, status = future.result()
+                done += 1
+                if status.startswith('failed'):
+                    failed += 1
+                    self.stderr.write(f"  product {pk}: {status}")
+                if done % 50 == 0 or done == total:
+                    rate = done / (time.monotonic() - started)
+                    self.stdout.write(f"  {done}/{total} ({rate:.1f}/s)")
+
+        # Workers wrote with update(), so drop the cached copies in one go
+        category_ids = Product.objects.order_by().values_list('category_id', flat=True).distinct()
+        catalog_cache.invalidate_products(pending, category_ids)
+        message = f"Done: {done - failed} generated, {failed} failed."
+        self.stdout.write(self.style.WARNING(message) if failed else self.style.SUCCESS(message))
+
+    def _pending_ids(self, batch_size, force):
+        """Ids of products with an image whose variants are missing or stale, by pk range."""
+        pending = []
+        last_pk = 0
+        while True:
+            batch = list(
+                Product.objects.filter(pk__gt=last_pk)
+                .exclude(image='').exclude(image__isnull=True)
+                .order_by('pk')
+                .values_list('pk', 'image', 'image_variants')[:batch_size]
+            )
+            if not batch:
+                return pending
+            for pk, image, variants in batch:
+                if force or (variants or {}).get('source') != image:
+                    pending.append(pk)
+            last_pk = batch[-1][0]
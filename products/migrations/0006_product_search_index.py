@@ -0,0 +1,25 @@
+from django.db import migrations
+
+from products import search
+
+
+def create_index(apps, schema_editor):
+    search.create_index(schema_editor)
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        schema_editor.execute(search.INDEX_SELECT)
+
+
+def drop_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_newslettersubscriber'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
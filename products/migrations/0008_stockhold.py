@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hold_key', models.CharField(max_length=40)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'expires_at'], name='stock_hold_product_exp_idx'), models.Index(fields=['hold_key'], name='stock_hold_key_idx'), models.Index(fields=['expires_at'], name='stock_hold_expires_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockhold',
+            constraint=models.UniqueConstraint(fields=('product', 'hold_key'), name='stock_hold_unique_key'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_stockhold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='gst_rate',
+            field=models.PositiveSmallIntegerField(choices=[(5, '5%'), (12, '12%'), (18, '18%'), (28, '28%')], default=18, verbose_name='GST slab (%)'),
+        ),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator
 from django.utils.text import slugify
 from django.utils.html import format_html
-from sorl.thumbnail import get_thumbnail
+from django.core.files.storage import default_storage
 from django.urls import reverse
 
 class NewsletterSubscriber(models.Model):
@@ -26,8 +26,14 @@ class Category(models.Model):
 
 
 class Product(models.Model):
+    # GST slabs (percent); component rates live in settings.INDIAN_TAX_RATES
+    GST_SLABS = (5, 12, 18, 28)
+    DEFAULT_GST_SLAB = 18
+
     name = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
+    # Supplier stock-keeping unit; import_catalog upserts on it
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     category = models.ForeignKey(
         Category,
         on_delete=models.CASCADE,
@@ -41,7 +47,14 @@ class Product(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(0.01)]
     )
+    gst_rate = models.PositiveSmallIntegerField(
+        'GST slab (%)',
+        choices=[(slab, f'{slab}%') for slab in GST_SLABS],
+        default=DEFAULT_GST_SLAB,
+    )
     image = models.ImageField(upload_to='product_images/', blank=True, null=True)
+    # Resized JPEG/WebP copies of image, filled in by products.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     stock = models.PositiveIntegerField(default=0)
     available = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False)
@@ -49,14 +62,13 @@ class Product(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
 
-    def image_preview(self, obj):
-        if obj.image:
-            try:
-                # Create or retrieve a cached 50x50 thumbnail
-                thumb = get_thumbnail(obj.image, '50x50', crop='center', quality=80)
-                return format_html('<img src="{}" width="50" height="50" />', thumb.url)
-            except Exception:
-                return "(Invalid image)"
+    def image_preview(self):
+        if self.image:
+            # Pre-generated 50x50 crop (see products.images); never resized here
+            thumb = self.image_variants.get('thumb')
+            if thumb and self.image_variants.get('source') == self.image.name:
+                return format_html('<img src="{}" width="50" height="50" />', default_storage.url(thumb['name']))
+            return "(Processing)"
         return "(No image)"
 
     image_preview.short_description = 'Preview'
@@ -71,9 +83,141 @@ class Product(models.Model):
     class Meta:
         ordering = ['-created_at'] # Always orders products by newest first in queries.
         verbose_name_plural = "Products" # Shows "Products" as the plural name in Django admin.
+        # One per hot storefront query; products.tests.QueryPlanTests checks they are used.
+        # Partial on the flag rather than leading with it: Django filters
+        # booleans as a bare `WHERE "available"`, which only a matching
+        # index condition can serve.
+        indexes = [
+            # Listing pages: newest first, keyset paged on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='product_listing_idx',
+                         condition=models.Q(available=True)),
+            # Category pages and the related-products fallback
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_listing_idx',
+                         condition=models.Q(available=True)),
+            # Home page featured products
+            models.Index(fields=['-created_at'], name='product_featured_idx',
+                         condition=models.Q(is_featured=True, available=True)),
+            # Admin changelist over every product: its newest-first sort and
+            # the date drill-down's range probes
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ]
 
 # Automatically generates a URL slug from the product name if it’s missing.
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
\ No newline at end of file
+            self.slug = self._unique_slug()
+        super().save(*args, **kwargs)
+
+    def _unique_slug(self):
+        base = slugify(self.name)[:190] or 'product'
+        slug, suffix = base, 2
+        while Product.objects.filter(slug=slug).exclude(pk=self.pk).exists():
+            slug = f'{base}-{suffix}'
+            suffix += 1
+        return slug
+
+
+class StockHold(models.Model):
+    """
+    Stock set aside for a shopper in checkout. A hold stops counting once
+    ``expires_at`` passes; ``expire_holds`` deletes the dead rows in bulk.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='holds')
+    hold_key = models.CharField(max_length=40)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'hold_key'], name='stock_hold_unique_key'),
+        ]
+        indexes = [
+            # Available-to-sell: SUM(quantity) of one product's live holds
+            models.Index(fields=['product', 'expires_at'], name='stock_hold_product_exp_idx'),
+            models.Index(fields=['hold_key'], name='stock_hold_key_idx'),
+            models.Index(fields=['expires_at'], name='stock_hold_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} until {self.expires_at:%H:%M}"
+
+
+class ProductRecommendation(models.Model):
+    """
+    One precomputed "customers also bought" neighbour of a product, written
+    by ``build_recommendations``. ``score`` is the number of orders that
+    contained both products; same-category fallbacks score below 1.
+    """
+    BOUGHT = 'bought'
+    CATEGORY = 'category'
+    SOURCE_CHOICES = [(BOUGHT, 'Bought together'), (CATEGORY, 'Same category')]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_for')
+    score = models.FloatField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'recommended'], name='product_rec_unique_pair'),
+        ]
+        indexes = [
+            # product_detail: a product's top-N neighbours
+            models.Index(fields=['product', '-score', 'recommended'], name='product_rec_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.recommended_id} ({self.score:g})"
+
+
+class RecommendationRun(models.Model):
+    """Progress of ``build_recommendations``: orders up to ``last_order_id`` are counted."""
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_order_id = models.BigIntegerField(default=0)
+    orders_processed = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Recommendations up to order {self.last_order_id}"
+
+
+class NewsletterCampaign(models.Model):
+    """
+    One mailing of the newsletter, sent by ``send_newsletter``. Each
+    subscriber it reaches gets a ``NewsletterDelivery`` row, so running the
+    command again for the same campaign carries on where it stopped.
+    """
+    name = models.SlugField(max_length=100, unique=True)
+    subject = models.CharField(max_length=200)
+    # Rendered once per run as <template>.html and <template>.txt
+    template = models.CharField(max_length=200, default='products/newsletter/campaign')
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name
+
+
+class NewsletterDelivery(models.Model):
+    """What happened when a campaign was mailed to one subscriber."""
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(SENT, 'Sent'), (FAILED, 'Failed')]
+
+    campaign = models.ForeignKey(NewsletterCampaign, on_delete=models.CASCADE, related_name='deliveries')
+    subscriber = models.ForeignKey(NewsletterSubscriber, on_delete=models.CASCADE, related_name='deliveries')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    error = models.TextField(blank=True)
+    attempted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Newsletter deliveries"
+        constraints = [
+            # Also serves send_newsletter's "not delivered yet" lookup
+            models.UniqueConstraint(fields=['campaign', 'subscriber'], name='newsletter_delivery_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign_id} -> {self.subscriber_id}: {self.status}"
@@ -0,0 +1,154 @@
+"""
+Newsletter delivery and the subscriber list export.
+
+``send_campaign`` mails a campaign to every subscriber without a delivery
+row for it yet. The templates are rendered once per run; each recipient
+only costs a copy of the finished message. Subscribers are read in
+batches of ``batch_size`` keyed on id, so no read stays open while mail
+goes out, and all messages share one SMTP connection (reopened if the
+server drops it). ``rate`` caps the messages per second.
+
+Delivery rows are written after each batch, and also when the run stops
+early (Ctrl-C, a connection that cannot be reopened). Only a killed
+process can leave up to one batch sent but unrecorded, to be mailed again
+on the next run. Recipients the server refuses are recorded as failed and
+are skipped on later runs, unless ``retry_failed`` is passed.
+"""
+import csv
+import smtplib
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .catalog_cache import get_featured_products
+from .models import NewsletterCampaign, NewsletterDelivery, NewsletterSubscriber
+
+BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+# Refusals for one recipient or message; anything else fails the connection
+RECIPIENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)
+
+
+class Throttle:
+    """Spaces calls to ``wait()`` at least ``1 / rate`` seconds apart; a rate of 0 is unlimited."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(self.next_at, now) + self.interval
+
+
+def render_campaign(campaign):
+    """(text, html) bodies of ``campaign``, the same for every recipient."""
+    context = {
+        'campaign': campaign,
+        'featured_products': get_featured_products(),
+        'site_url': settings.SITE_URL.rstrip('/'),
+    }
+    return (render_to_string(f'{campaign.template}.txt', context),
+            render_to_string(f'{campaign.template}.html', context))
+
+
+def pending_subscribers(campaign, retry_failed=False):
+    """Subscribers ``campaign`` has not reached yet, in id order."""
+    done = NewsletterDelivery.objects.filter(campaign=campaign, subscriber=OuterRef('pk'))
+    if retry_failed:
+        done = done.filter(status=NewsletterDelivery.SENT)
+    return NewsletterSubscriber.objects.filter(~Exists(done)).order_by('pk')
+
+
+def send_campaign(campaign, batch_size=BATCH_SIZE, rate=None, retry_failed=False, connection=None, progress=None):
+    """
+    Mail ``campaign`` to its pending subscribers. Returns the (sent, failed)
+    counts of this run; ``progress(sent, failed)`` is called after each batch.
+    """
+    rate = settings.NEWSLETTER_SEND_RATE if rate is None else rate
+    text, html = render_campaign(campaign)
+    connection = connection or get_connection()
+    throttle = Throttle(rate)
+    pending = pending_subscribers(campaign, retry_failed)
+    sent = failed = 0
+    last_id = 0
+
+    with connection:
+        while True:
+            batch = list(pending.filter(pk__gt=last_id).values_list('pk', 'email')[:batch_size])
+            if not batch:
+                break
+            deliveries = []
+            try:
+                for subscriber_id, email in batch:
+                    message = EmailMultiAlternatives(campaign.subject, text, to=[email], connection=connection)
+                    message.attach_alternative(html, 'text/html')
+                    throttle.wait()
+                    error = _send(connection, message)
+                    deliveries.append(NewsletterDelivery(
+                        campaign=campaign, subscriber_id=subscriber_id, error=error,
+                        status=NewsletterDelivery.FAILED if error else NewsletterDelivery.SENT,
+                    ))
+            finally:
+                batch_sent, batch_failed = _record(deliveries)
+                sent += batch_sent
+                failed += batch_failed
+            last_id = batch[-1][0]
+            if progress:
+                progress(sent, failed)
+
+    NewsletterCampaign.objects.filter(pk=campaign.pk).update(finished_at=timezone.now())
+    return sent, failed
+
+
+def _send(connection, message):
+    """Send one message; the error for a refused recipient, else ''."""
+    for attempt in range(2):
+        try:
+            connection.send_messages([message])
+            return ''
+        except RECIPIENT_ERRORS as exc:
+            return str(exc)[:1000]
+        except OSError:
+            # Dropped or timed-out connection: reopen it and try once more
+            if attempt:
+                raise
+            connection.close()
+            connection.open()
+
+
+def _record(deliveries):
+    if not deliveries:
+        return 0, 0
+    # Upsert: a retried recipient replaces its failed row
+    NewsletterDelivery.objects.bulk_create(
+        deliveries, update_conflicts=True, unique_fields=['campaign', 'subscriber'],
+        update_fields=['status', 'error', 'attempted_at'],
+    )
+    failed = sum(d.status == NewsletterDelivery.FAILED for d in deliveries)
+    return len(deliveries) - failed, failed
+
+
+class _Echo:
+    """File-like object that hands back what is written, for streaming csv.writer rows."""
+
+    def write(self, value):
+        return value
+
+
+def subscriber_csv(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the subscriber list as CSV, one line at a time."""
+    queryset = NewsletterSubscriber.objects.all() if queryset is None else queryset
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['email', 'subscribed_at'])
+    rows = queryset.order_by('pk').values_list('email', 'subscribed_at').iterator(chunk_size=chunk_size)
+    for email, subscribed_at in rows:
+        yield writer.writerow([email, subscribed_at.isoformat()])
@@ -0,0 +1,260 @@
+"""
+Whole-page cache for anonymous visitors, and the version it shares with
+the template fragment caches used for everyone else.
+
+``cache_anonymous_page`` answers GET and HEAD requests that carry no
+session or messages cookie from the cache, before the view runs: no
+session load, no user lookup, no query. Pages are keyed on the path and
+the normalized query string (sorted, empty values dropped). A request
+with query parameters the view does not use is never cached, so tracking
+parameters cannot fill the cache.
+
+Pages are rendered with a placeholder CSRF token (the ``csrf`` context
+processor below) that each visitor's own token replaces on the way out.
+The token lives in a cookie, so that costs nothing either.
+
+Catalog changes call ``invalidate_pages`` (through
+``catalog_cache.invalidate_products``). It moves ``PAGE_VERSION_KEY`` on,
+so every page and fragment of the old version is left to expire unread.
+
+``conditional_page`` adds ETag/Last-Modified revalidation. A browser or
+shared proxy that already holds the page gets ``304 Not Modified`` without
+the view running. ETags include a hash of the visitor's session cookie
+and CSRF token (``page_etag``): a page naming a logged-in user, or holding
+a CSRF token, is never reused for someone else. When the view issues a
+new token (a first visit), the ETag is recomputed with it, so the next
+request, which carries that token, can revalidate.
+
+Both decorators also wrap ``async def`` views (served under ASGI): cache
+hits and 304s are then answered on the event loop, through the cache's
+async API, without taking a thread.
+"""
+import datetime
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from .cache_versions import aget_version, bump_version, get_version
+
+PAGE_CACHE_TIMEOUT = 60 * 10
+PAGE_VERSION_KEY = 'pages:version'
+CSRF_PLACEHOLDER = 'page-cache-csrf-token-placeholder'
+
+
+def page_version():
+    return get_version(PAGE_VERSION_KEY)
+
+
+async def apage_version():
+    return await aget_version(PAGE_VERSION_KEY)
+
+
+def invalidate_pages():
+    """Retire every cached page and fragment at once by moving to a new version."""
+    bump_version(PAGE_VERSION_KEY)
+
+
+def normalized_query(query_dict):
+    """``a=1&b=2`` for ``?b=2&a=1&c=``: parameters sorted, empty values dropped."""
+    return urlencode(sorted(
+        (key, value) for key, values in query_dict.lists() for value in values if value.strip()
+    ))
+
+
+def page_key(request, version):
+    path = f'{request.path}?{normalized_query(request.GET)}'
+    return f'page:{version}:{hashlib.md5(path.encode()).hexdigest()}'
+
+
+def _cacheable(request, params):
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+        and set(request.GET) <= params
+    )
+
+
+def _storable(request, response):
+    session = getattr(request, 'session', None)
+    return (request.method == 'GET' and response.status_code == 200 and not response.streaming
+            and not response.cookies and not (session is not None and session.modified))
+
+
+def _with_token(response, request):
+    """Swap the placeholder for this visitor's CSRF token; the cached copy stays shared."""
+    placeholder = CSRF_PLACEHOLDER.encode()
+    if placeholder in response.content:
+        response.content = response.content.replace(placeholder, get_token(request).encode())
+    # Shared caches downstream must not give this page to a logged-in user
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cache_anonymous_page(params=(), timeout=PAGE_CACHE_TIMEOUT):
+    """Cache a view's page for cookie-less visitors; ``params`` are the query parameters it reads."""
+    params = set(params)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                if not _cacheable(request, params):
+                    return await view(request, *args, **kwargs)
+                key = page_key(request, await apage_version())
+                cached = await cache.aget(key)
+                if cached is not None:
+                    content, content_type = cached
+                    return _with_token(HttpResponse(content, content_type=content_type), request)
+
+                request.page_cache_render = True
+                response = await view(request, *args, **kwargs)
+                if _storable(request, response):
+                    await cache.aset(key, (response.content, response['Content-Type']), timeout)
+                return _with_token(response, request)
+            return async_wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if not _cacheable(request, params):
+                return view(request, *args, **kwargs)
+            key = page_key(request, page_version())
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return _with_token(HttpResponse(content, content_type=content_type), request)
+
+            request.page_cache_render = True
+            response = view(request, *args, **kwargs)
+            if _storable(request, response):
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+            return _with_token(response, request)
+        return wrapped
+    return decorator
+
+
+def _csrf_secret(request):
+    """The CSRF token the visitor holds after this response: issued or rotated by the view, else their cookie's."""
+    return request.META.get('CSRF_COOKIE') or request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+
+
+def page_etag(request, *parts):
+    """Strong ETag for ``parts`` as seen by this visitor (no session load, no query)."""
+    viewer = (request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''), _csrf_secret(request))
+    return hashlib.md5(repr((parts, viewer)).encode()).hexdigest()
+
+
+def listing_etag(request, *args, **kwargs):
+    """Any catalog change moves the page version, so path + query + version identify a listing."""
+    return page_etag(request, request.path, normalized_query(request.GET), page_version())
+
+
+async def alisting_etag(request, *args, **kwargs):
+    return page_etag(request, request.path, normalized_query(request.GET), await apage_version())
+
+
+async def _acall(func, *args, **kwargs):
+    if iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await sync_to_async(func)(*args, **kwargs)
+
+
+async def _acondition(view, etag_func, last_modified_func, request, *args, **kwargs):
+    """``condition()`` for an async view, whose validators may be coroutine functions too."""
+    csrf_secret = _csrf_secret(request)
+    etag = await _acall(etag_func, request, *args, **kwargs)
+    etag = quote_etag(etag) if etag is not None else None
+    last_modified = None
+    if last_modified_func:
+        dt = await _acall(last_modified_func, request, *args, **kwargs)
+        if dt:
+            if not timezone.is_aware(dt):
+                dt = timezone.make_aware(dt, datetime.timezone.utc)
+            last_modified = int(dt.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await view(request, *args, **kwargs)
+        if etag and _csrf_secret(request) != csrf_secret:
+            etag = quote_etag(await _acall(etag_func, request, *args, **kwargs))
+            response.headers['ETag'] = etag
+    if request.method in ('GET', 'HEAD'):
+        if last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        if etag:
+            response.headers.setdefault('ETag', etag)
+    return response
+
+
+def conditional_page(etag_func, last_modified_func=None):
+    """
+    ``condition()`` plus ``Cache-Control: no-cache``, so browsers and proxies
+    revalidate before every reuse. Skipped while flash messages are pending:
+    they must be rendered.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapped(request, *args, **kwargs):
+                if CookieStorage.cookie_name in request.COOKIES:
+                    return await view(request, *args, **kwargs)
+                response = await _acondition(view, etag_func, last_modified_func, request, *args, **kwargs)
+                return _revalidate(request, response)
+            return async_wrapped
+
+        conditional = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if CookieStorage.cookie_name in request.COOKIES:
+                return view(request, *args, **kwargs)
+            csrf_secret = _csrf_secret(request)
+            response = conditional(request, *args, **kwargs)
+            # The view issued a token: tag the page for the visitor who now holds it
+            if response.has_header('ETag') and _csrf_secret(request) != csrf_secret:
+                response.headers['ETag'] = quote_etag(etag_func(request, *args, **kwargs))
+            return _revalidate(request, response)
+        return wrapped
+    return decorator
+
+
+def _revalidate(request, response):
+    # Shared caches may keep cookie-less pages, never one that sets a cookie
+    shared = (settings.SESSION_COOKIE_NAME not in request.COOKIES
+              and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE') and not response.cookies)
+    patch_cache_control(response, no_cache=True, **({'public': True} if shared else {'private': True}))
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def csrf(request):
+    """Context processor: the placeholder token while a page is rendered for the cache."""
+    if getattr(request, 'page_cache_render', False):
+        return {'csrf_token': CSRF_PLACEHOLDER}
+    return {}
+
+
+def fragment_context(request):
+    """Template variables that key the ``{% cache %}`` fragments of a page."""
+    return {
+        'page_version': page_version(),
+        'page_query': normalized_query(request.GET),
+    }
+
+
+async def afragment_context(request):
+    return {
+        'page_version': await apage_version(),
+        'page_query': normalized_query(request.GET),
+    }
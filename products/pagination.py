@@ -0,0 +1,175 @@
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+
+PRODUCTS_PER_PAGE = 12
+
+# Page-number links are only offered this deep; past it we switch to cursors
+# so the COUNT and OFFSET stay bounded whatever the catalog size.
+MAX_NUMBERED_PAGES = 10
+
+# Below this the planner's estimate is not trusted: an exact count is cheap
+ESTIMATED_COUNT_THRESHOLD = 10_000
+
+
+def encode_cursor(created_at, pk, direction):
+    payload = json.dumps([direction, created_at.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (direction, created_at, pk), or None for a malformed cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, created_at, pk = json.loads(base64.urlsafe_b64decode(padded))
+        created_at = parse_datetime(created_at)
+        if direction not in ('next', 'prev') or created_at is None:
+            return None
+        return direction, created_at, int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+def encode_offset_cursor(offset):
+    payload = json.dumps(['offset', offset], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_offset_cursor(cursor):
+    """Return the offset, or None for a malformed or keyset cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        kind, offset = json.loads(base64.urlsafe_b64decode(padded))
+        if kind != 'offset' or not isinstance(offset, int) or offset < 0:
+            return None
+        return offset
+    except (ValueError, TypeError):
+        return None
+
+
+class CursorPage:
+    """A page of products plus opaque cursors to its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over ``(created_at, id)``, newest first.
+
+    Each page is a single indexed range scan of ``per_page + 1`` rows: no
+    COUNT query and no OFFSET, so page 1000 costs the same as page 1.
+    """
+
+    def __init__(self, queryset, per_page=PRODUCTS_PER_PAGE, key=None):
+        self.queryset = queryset
+        self.per_page = per_page
+        # (created_at, pk) of a row; values_list() querysets pass their own
+        self.key = key or (lambda row: (row.created_at, row.pk))
+
+    def page(self, cursor=None):
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._page_after(None, None, first=True)
+        direction, created_at, pk = decoded
+        if direction == 'prev':
+            return self._page_before(created_at, pk)
+        return self._page_after(created_at, pk)
+
+    def _page_after(self, created_at, pk, first=False):
+        qs = self.queryset.order_by('-created_at', '-id')
+        if not first:
+            qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor(rows[-1], 'next') if has_more else None,
+            previous_cursor=self._cursor(rows[0], 'prev') if rows and not first else None,
+        )
+
+    def _page_before(self, created_at, pk):
+        qs = self.queryset.order_by('created_at', 'id').filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        )
+        rows = list(qs[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        if not rows:
+            return self._page_after(None, None, first=True)
+        return CursorPage(
+            rows,
+            next_cursor=self._cursor(rows[-1], 'next'),
+            previous_cursor=self._cursor(rows[0], 'prev') if has_more else None,
+        )
+
+    def _cursor(self, row, direction):
+        created_at, pk = self.key(row)
+        return encode_cursor(created_at, pk, direction)
+
+
+class OffsetCursorPaginator:
+    """
+    Ranked search results past the numbered pages. Relevance has no key to
+    seek on, so these cursors carry an offset; the full-text match has
+    already narrowed the rows the OFFSET walks.
+    """
+
+    def __init__(self, queryset, per_page=PRODUCTS_PER_PAGE):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        offset = (decode_offset_cursor(cursor) if cursor else None) or 0
+        rows = list(self.queryset[offset:offset + self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        return CursorPage(
+            rows[:self.per_page],
+            next_cursor=encode_offset_cursor(offset + self.per_page) if has_more else None,
+            previous_cursor=encode_offset_cursor(max(offset - self.per_page, 0)) if offset else None,
+        )
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Page numbers over the planner's row estimate instead of a COUNT(*).
+
+    On PostgreSQL a count reads every matching row; the admin changelist
+    asks for one on every page view. Estimates of ``ESTIMATED_COUNT_THRESHOLD``
+    rows or more are used as is; smaller ones, and other databases (where
+    the count is answered from an index), get the exact count.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            plan = json.loads(queryset.order_by().explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
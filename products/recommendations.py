@@ -0,0 +1,150 @@
+"""
+Precomputed "customers also bought" neighbours.
+
+``build`` walks the orders in id order, a window at a time, and counts how
+often each pair of products shared an order. The counts are added into
+``ProductRecommendation`` with one upsert per flush, together with the
+run's watermark, so the next run only reads orders placed since. Memory is
+bounded by ``max_pairs``: the counter is flushed whenever it grows past it.
+Counts are never trimmed, so a score stays the number of orders containing
+both products however many runs it was counted over.
+
+Products with few co-purchases are topped up with the featured and newest
+products of their category; an incremental run only redoes the categories
+with products changed since the previous run. Moving a product to another
+category leaves it in its old category's fallback rows until the next
+``full`` build. ``catalog_cache.get_related_products`` reads a product's
+top neighbours with one indexed query.
+"""
+from collections import Counter
+from itertools import groupby, permutations
+from operator import itemgetter
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .catalog_cache import RELATED_LIMIT
+from .models import Category, Product, ProductRecommendation, RecommendationRun
+
+ORDERS_PER_WINDOW = 2000
+MAX_PAIRS = 200_000
+# Larger orders (bulk buys, test data) say little about affinity
+MAX_BASKET = 50
+INSERT_BATCH = 1000
+
+
+def _upsert_sql():
+    table = connection.ops.quote_name(ProductRecommendation._meta.db_table)
+    # A pair first seen as a category fallback starts counting from zero
+    return (
+        f"INSERT INTO {table} (product_id, recommended_id, score, source, updated_at) "
+        f"VALUES (%s, %s, %s, %s, %s) "
+        f"ON CONFLICT (product_id, recommended_id) DO UPDATE SET "
+        f"score = CASE WHEN {table}.source = excluded.source THEN {table}.score ELSE 0 END + excluded.score, "
+        f"source = excluded.source, updated_at = excluded.updated_at"
+    )
+
+
+def _flush(counter, run):
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    rows = [(a, b, count, ProductRecommendation.BOUGHT, now) for (a, b), count in counter.items()]
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            sql = _upsert_sql()
+            for start in range(0, len(rows), INSERT_BATCH):
+                cursor.executemany(sql, rows[start:start + INSERT_BATCH])
+        # Saved with the counts, so an interrupted run resumes where it flushed
+        run.save(update_fields=['last_order_id', 'orders_processed'])
+    counter.clear()
+
+
+def _order_windows(after_order_id, window_size):
+    """
+    Yield ``(last order id, orders in window, (order_id, product_id) rows)``
+    for consecutive windows of ``window_size`` orders, keyset paged on id.
+    """
+    while True:
+        order_ids = list(
+            Order.objects.filter(pk__gt=after_order_id).order_by('pk').values_list('pk', flat=True)[:window_size]
+        )
+        if not order_ids:
+            return
+        items = (
+            OrderItem.objects.filter(order_id__gte=order_ids[0], order_id__lte=order_ids[-1])
+            .order_by('order_id').values_list('order_id', 'product_id')
+        )
+        yield order_ids[-1], len(order_ids), items
+        after_order_id = order_ids[-1]
+
+
+def count_pairs(run, after_order_id=0, window_size=ORDERS_PER_WINDOW, max_pairs=MAX_PAIRS):
+    """Add co-purchase counts for orders after ``after_order_id``; returns the orders read."""
+    counter = Counter()
+    processed = 0
+    for last_order_id, order_count, items in _order_windows(after_order_id, window_size):
+        for _, group in groupby(items, key=itemgetter(0)):
+            basket = sorted({product_id for _, product_id in group})
+            if 1 < len(basket) <= MAX_BASKET:
+                counter.update(permutations(basket, 2))
+        processed += order_count
+        run.last_order_id = last_order_id
+        run.orders_processed = processed
+        if len(counter) >= max_pairs:
+            _flush(counter, run)
+    _flush(counter, run)
+    return processed
+
+
+def changed_categories(since):
+    """Ids of the categories holding a product created or edited since ``since``."""
+    return set(Product.objects.filter(updated_at__gte=since).order_by().values_list('category_id', flat=True))
+
+
+def fill_from_categories(limit=RELATED_LIMIT, category_ids=None):
+    """Rewrite the same-category fallback rows, one category at a time (all of them by default)."""
+    if category_ids is None:
+        category_ids = Category.objects.values_list('pk', flat=True)
+    written = 0
+    for category_id in category_ids:
+        top = list(
+            Product.objects.filter(category_id=category_id, available=True)
+            .order_by('-is_featured', '-created_at', '-pk').values_list('pk', flat=True)[:limit + 1]
+        )
+        members = list(Product.objects.filter(category_id=category_id).values_list('pk', flat=True))
+        with transaction.atomic():
+            ProductRecommendation.objects.filter(
+                product__category_id=category_id, source=ProductRecommendation.CATEGORY
+            ).delete()
+            for start in range(0, len(members), INSERT_BATCH):
+                rows = [
+                    # Always below one co-purchase, best candidate first
+                    ProductRecommendation(product_id=pk, recommended_id=other,
+                                          score=(len(top) - rank) / (len(top) + 1),
+                                          source=ProductRecommendation.CATEGORY)
+                    for pk in members[start:start + INSERT_BATCH]
+                    for rank, other in enumerate(o for o in top if o != pk)
+                    if rank < limit
+                ]
+                # Pairs already bought together keep their co-purchase row
+                ProductRecommendation.objects.bulk_create(rows, batch_size=INSERT_BATCH, ignore_conflicts=True)
+                written += len(rows)
+    return written
+
+
+def build(full=False, window_size=ORDERS_PER_WINDOW, max_pairs=MAX_PAIRS):
+    """Bring the recommendations up to date; returns the finished ``RecommendationRun``."""
+    previous = RecommendationRun.objects.order_by('-pk').first()
+    if full or previous is None:
+        ProductRecommendation.objects.all().delete()
+        after_order_id, category_ids = 0, None
+    else:
+        after_order_id = previous.last_order_id
+        category_ids = changed_categories(previous.started_at)
+
+    run = RecommendationRun.objects.create(last_order_id=after_order_id)
+    count_pairs(run, after_order_id, window_size, max_pairs)
+    fill_from_categories(category_ids=category_ids)
+    run.finished_at = timezone.now()
+    run.save(update_fields=['finished_at'])
+    return run
@@ -0,0 +1,148 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_product_fts'
+
+# bm25 column weights: name, category, description.
+# A hit in the name always outranks the same hit in the description.
+RANK_WEIGHTS = (10.0, 4.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+INDEX_SELECT = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, category, description)
+    SELECT p.id, p.name, COALESCE(c.name, ''), p.description
+    FROM products_product p
+    LEFT JOIN products_category c ON c.id = p.category_id
+"""
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def create_index(schema_editor=None):
+    """Create the FTS5 table (no-op on databases without FTS5)."""
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, category, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+
+def drop_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def rebuild_index():
+    """Drop every indexed row and re-index the whole catalog in one statement."""
+    if not fts_enabled():
+        return 0
+    create_index()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(INDEX_SELECT)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def index_products(product_ids):
+    if not fts_enabled() or not product_ids:
+        return
+    ids = list(product_ids)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids)
+        cursor.execute(f"{INDEX_SELECT} WHERE p.id IN ({placeholders})", ids)
+
+
+def index_category(category_id):
+    """Re-index every product of a category (after the category is renamed)."""
+    if not fts_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+            "(SELECT id FROM products_product WHERE category_id = %s)",
+            [category_id],
+        )
+        cursor.execute(f"{INDEX_SELECT} WHERE p.category_id = %s", [category_id])
+
+
+def unindex_products(product_ids):
+    if not fts_enabled() or not product_ids:
+        return
+    ids = list(product_ids)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", ids)
+
+
+def build_match(query):
+    """
+    Turn free text from the search box into a safe FTS5 MATCH expression.
+    Every word must match, and the last one is matched as a prefix so
+    results keep up with the user while they type.
+    """
+    tokens = _TOKEN_RE.findall(query or '')
+    if not tokens:
+        return None
+    terms = ['"%s"' % token for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def match_products(queryset, query):
+    """Restrict ``queryset`` to products matching ``query``, without ranking."""
+    if not fts_enabled():
+        return queryset.filter(
+            Q(name__icontains=query)
+            | Q(description__icontains=query)
+            | Q(category__name__icontains=query)
+        )
+
+    match = build_match(query)
+    if match is None:
+        return queryset
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (match,))
+    )
+
+
+def rank_products(queryset, query):
+    """Order an already matched queryset by relevance (best first)."""
+    match = build_match(query)
+    if not fts_enabled() or match is None:
+        return queryset
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    table = queryset.model._meta.db_table
+    # Joined rather than a correlated subquery: FTS5 then expands the match
+    # once, not once per hit (seconds for a common prefix on a big catalog)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+        params=[match],
+        select={'search_rank': f"bm25({FTS_TABLE}, {weights})"},
+    ).order_by('search_rank', '-created_at', '-id')
+
+
+def search_products(queryset, query):
+    """
+    Restrict ``queryset`` to products matching ``query`` and order them by
+    relevance. Other filters on the queryset are applied by the database on
+    top of the index lookup, so the cost is driven by the number of hits,
+    not the size of the catalog.
+    """
+    return rank_products(match_products(queryset, query), query)
@@ -0,0 +1,86 @@
+import logging
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import catalog_cache, images, search
+from .facets import invalidate_facets
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_init, sender=Product)
+def remember_category(sender, instance, **kwargs):
+    # Moving a product between categories must refresh both related lists.
+    # Read __dict__ so .only() querysets don't load the deferred column.
+    instance._loaded_category_id = instance.__dict__.get('category_id')
+
+
+def _product_category_ids(instance):
+    return {instance.category_id, getattr(instance, '_loaded_category_id', None)}
+
+
+# The FTS table lives in the same database, so index writes share the
+# transaction of the row that triggered them.
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_products([instance.pk])
+    invalidate_facets()
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.unindex_products([instance.pk])
+    invalidate_facets()
+
+
+@receiver(post_save, sender=Product)
+def refresh_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Resizing happens off the request path; until it finishes, templates
+    # fall back to the original upload
+    try:
+        images.schedule_refresh(instance)
+    except OSError:
+        logger.exception("Could not build image variants for product %s", instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def delete_image_variants(sender, instance, **kwargs):
+    images.delete_variants(instance.image_variants)
+
+
+# Covers the admin change form and list_editable rows alike: both end in
+# Product.save().
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    catalog_cache.invalidate_products([instance.pk], _product_category_ids(instance))
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created=False, raw=False, **kwargs):
+    # A new category has no products yet; a renamed one changes their index rows
+    if raw or created:
+        return
+    search.index_category(instance.pk)
+
+
+@receiver(post_delete, sender=Category)
+def drop_category_facets(sender, instance, **kwargs):
+    invalidate_facets()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    catalog_cache.invalidate_categories([instance.pk])
@@ -0,0 +1,55 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+DEFAULT_SIZES = '(max-width: 576px) 100vw, (max-width: 992px) 50vw, 33vw'
+
+
+def _srcset(entries):
+    return ', '.join(f"{default_storage.url(e['name'])} {e['width']}w" for e in entries)
+
+
+@register.simple_tag
+def product_picture(product, sizes=DEFAULT_SIZES, css_class='', style='', loading='lazy'):
+    """
+    ``<picture>`` for a product image with WebP and JPEG ``srcset``s, built
+    from the stored variant metadata only. Products whose variants have not
+    been generated yet fall back to the original upload.
+    """
+    variants = product.image_variants or {}
+    if not product.image:
+        return ''
+    if variants.get('source') != product.image.name or not variants.get('jpeg'):
+        return format_html(
+            '<img src="{}" class="{}" style="{}" alt="{}" loading="{}">',
+            product.image.url, css_class, style, product.name, loading,
+        )
+
+    jpeg = variants['jpeg']
+    fallback = jpeg[min(1, len(jpeg) - 1)]
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((f'image/{key}', _srcset(variants[key]), sizes) for key in ('webp',) if variants.get(key)),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" '
+        'class="{}" style="{}" alt="{}" loading="{}" decoding="async"></picture>',
+        sources, default_storage.url(fallback['name']), _srcset(jpeg), sizes,
+        fallback['width'], fallback['height'], css_class, style, product.name, loading,
+    )
+
+
+@register.simple_tag
+def product_image_url(product, width=400):
+    """URL of the smallest JPEG variant at least ``width`` pixels wide."""
+    if not product.image:
+        return ''
+    variants = product.image_variants or {}
+    if variants.get('source') != product.image.name or not variants.get('jpeg'):
+        return product.image.url
+    for entry in variants['jpeg']:
+        if entry['width'] >= width:
+            return default_storage.url(entry['name'])
+    return default_storage.url(variants['jpeg'][-1]['name'])
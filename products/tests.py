@@ -0,0 +1,137 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Category, Product
+from .pagination import encode_cursor
+
+# Queries on these tables must be served by an index
+HOT_TABLES = ('products_product',)
+# ORDER BY a value computed per query can only be sorted; the row set is
+# already narrowed by the full-text match
+SORT_ALLOWED = ('search_rank',)
+
+SQLITE_FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def explain(sql):
+    """The plan of ``sql`` as a list of lines."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+        # Only report a scan or sort the planner cannot avoid: on small
+        # tables PostgreSQL prefers them even when an index fits. The
+        # savepoint is rolled back so the settings do not outlive the plan.
+        with transaction.atomic():
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('SET LOCAL enable_sort = off')
+            cursor.execute('EXPLAIN ' + sql)
+            plan = [row[0] for row in cursor.fetchall()]
+            transaction.set_rollback(True)
+        return plan
+
+
+def regressions(sql, plan):
+    """A description of each full scan or unindexed sort of a hot table in ``plan``."""
+    sort_allowed = any(name in sql for name in SORT_ALLOWED)
+    for line in plan:
+        detail = line.strip()
+        if connection.vendor == 'sqlite':
+            scan = SQLITE_FULL_SCAN.match(detail)
+            if scan and scan.group(1) in HOT_TABLES:
+                yield f"full table scan ({detail})"
+            if 'TEMP B-TREE FOR ORDER BY' in detail and not sort_allowed:
+                yield f"sort without an index ({detail})"
+        else:
+            if any(f'Seq Scan on {table}' in detail for table in HOT_TABLES):
+                yield f"full table scan ({detail})"
+            if detail.lstrip('-> ').startswith('Sort ') and not sort_allowed:
+                yield f"sort without an index ({detail})"
+
+
+# Bypass the catalog and page caches so every page runs its queries; plain
+# static storage, as the tests run without collectstatic's manifest
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(TestCase):
+    """Every catalog query of the storefront pages is served by an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Query plan check', slug='query-plan-check')
+        cls.products = [
+            Product.objects.create(name=f'Query plan toy {i}', category=cls.category, description='Plan check',
+                                   price=10, stock=5, is_featured=True)
+            for i in range(3)
+        ]
+
+    def assertIndexedQueries(self, url):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f"Query plans are only checked on SQLite and PostgreSQL, not {connection.vendor}.")
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        problems = []
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT') or not any(t in sql for t in HOT_TABLES):
+                continue
+            problems += [f"{detail}\n    {sql[:300]}" for detail in regressions(sql, explain(sql))]
+        if problems:
+            self.fail(f"{url}: hot queries not served by an index:\n" + "\n".join(problems))
+
+    def test_home(self):
+        self.assertIndexedQueries(reverse('home'))
+
+    def test_product_list(self):
+        self.assertIndexedQueries(reverse('products:list'))
+
+    def test_product_list_older_page(self):
+        last = self.products[0]
+        self.assertIndexedQueries(
+            reverse('products:list') + '?cursor=' + encode_cursor(last.created_at, last.pk, 'next')
+        )
+
+    def test_product_list_numbered_page(self):
+        self.assertIndexedQueries(reverse('products:list') + '?page=2')
+
+    def test_category(self):
+        self.assertIndexedQueries(reverse('products:by_category', args=[self.category.slug]))
+
+    def test_search(self):
+        self.assertIndexedQueries(reverse('products:search') + '?query=toy')
+
+    def test_product_detail(self):
+        self.assertIndexedQueries(self.products[0].get_absolute_url())
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class ConditionalPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Revalidation', slug='revalidation')
+        cls.product = Product.objects.create(name='Revalidated toy', category=category, description='-',
+                                             price=10, stock=5)
+
+    def test_first_etag_revalidates(self):
+        # The first response issues the CSRF cookie; its ETag must match the
+        # next request, which carries that cookie
+        for url in (reverse('products:list'), self.product.get_absolute_url()):
+            with self.subTest(url=url):
+                self.client.cookies.clear()
+                first = self.client.get(url)
+                self.assertIn(settings.CSRF_COOKIE_NAME, first.cookies)
+                again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(again.status_code, 304)
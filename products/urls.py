@@ -1,16 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'products'
 
+# Under ASGI (toystore/asgi.py) the read-heavy pages are served by async views
+if settings.ASYNC_VIEWS:
+    product_list, product_detail = views.product_list_async, views.product_detail_async
+else:
+    product_list, product_detail = views.product_list, views.product_detail
+
 urlpatterns = [
     # Product listing and search
-    path('', views.product_list, name='list'),
-    path('search/', views.product_list, name='search'),
-    path('category/<slug:category_slug>/', views.product_list, name='by_category'),
+    path('', product_list, name='list'),
+    path('search/', product_list, name='search'),
+    path('category/<slug:category_slug>/', product_list, name='by_category'),
     path("subscribe/", views.newsletter_subscribe, name="newsletter_subscribe"),
 
     # Product detail views (with and without slug)
-    path('product/<int:pk>/', views.product_detail, name='detail'),
-    path('product/<int:pk>/<slug:slug>/', views.product_detail, name='detail_with_slug'),
+    path('product/<int:pk>/', product_detail, name='detail'),
+    path('product/<int:pk>/<slug:slug>/', product_detail, name='detail_with_slug'),
+
+    # Read-only JSON API (see api.py)
+    path('api/categories/', api.categories, name='api_categories'),
+    path('api/products/', api.product_list, name='api_products'),
+    path('api/products/export.ndjson', api.product_export, name='api_export'),
+    path('api/products/<int:pk>/', api.product_detail, name='api_product'),
 ]
\ No newline at end of file
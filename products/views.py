@@ -1,8 +1,25 @@
-from django.shortcuts import render, get_object_or_404, redirect
+import functools
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render, redirect
 from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Category, Product
+from django.http import Http404
+from .models import Product
 from .forms import ProductSearchForm, NewsletterForm
+from .search import match_products, rank_products
+from .facets import PRICE_STEP, filter_key, get_facets
+from .catalog_cache import (
+    aget_featured_products, aget_product, aget_related_products,
+    get_categories, get_featured_products, get_product, get_related_products,
+)
+from .pagination import (
+    CursorPaginator, OffsetCursorPaginator, encode_cursor, encode_offset_cursor, PRODUCTS_PER_PAGE,
+    MAX_NUMBERED_PAGES,
+)
+from .page_cache import (
+    afragment_context, alisting_etag, cache_anonymous_page, conditional_page, fragment_context, listing_etag,
+    page_etag,
+)
 from django.contrib import messages
 
 
@@ -17,65 +34,170 @@ def newsletter_subscribe(request):
             messages.error(request, "This email is already subscribed or invalid.")
 
 
+# Query parameters product_list reads; anything else bypasses the page cache
+LIST_PARAMS = ('query', 'category', 'min_price', 'max_price', 'in_stock', 'page', 'cursor')
+
+
+# Templates read request.user (a session and user query) and lazy
+# relations, so async views render in a thread
+arender = sync_to_async(render)
+
 
+@conditional_page(listing_etag)
+@cache_anonymous_page(params=LIST_PARAMS)
 def product_list(request, category_slug=None):
+    return _product_list_page(request, category_slug)
+
+
+@conditional_page(alisting_etag)
+@cache_anonymous_page(params=LIST_PARAMS)
+async def product_list_async(request, category_slug=None):
+    # Search, facets and pagination are sync helpers: one thread hop for all of them
+    return await sync_to_async(_product_list_page)(request, category_slug)
+
+
+def _product_list_page(request, category_slug=None):
     category = None
-    categories = Category.objects.all()
+    categories = get_categories()
     products = Product.objects.filter(available=True).order_by('-created_at')
 
     # Initialize search form with GET parameters
     search_form = ProductSearchForm(request.GET or None)
 
     if category_slug:
-        category = get_object_or_404(Category, slug=category_slug)
+        category = next((cat for cat in categories if cat.slug == category_slug), None)
+        if category is None:
+            raise Http404("No Category matches the given query.")
         products = products.filter(category=category)
 
+    ranked = False
+    filters = {}
+    query = ''
+
     # Apply search filters if form is valid
     if search_form.is_valid():
         query = search_form.cleaned_data.get('query')
-        selected_category = search_form.cleaned_data.get('category')
-        min_price = search_form.cleaned_data.get('min_price')
-        max_price = search_form.cleaned_data.get('max_price')
-        in_stock = search_form.cleaned_data.get('in_stock')
+        filters = {
+            'category': search_form.cleaned_data.get('category'),
+            'min_price': search_form.cleaned_data.get('min_price'),
+            'max_price': search_form.cleaned_data.get('max_price'),
+            'in_stock': search_form.cleaned_data.get('in_stock'),
+        }
 
         if query:
-            products = products.filter(
-                Q(name__icontains=query)
-            )
-        if selected_category:
-            products = products.filter(category=selected_category)
-        if min_price is not None:
-            products = products.filter(price__gte=min_price)
-        if max_price is not None:
-            products = products.filter(price__lte=max_price)
-        if in_stock:
-            products = products.filter(stock__gt=0)
-
-    # Moved pagination outside of search_form.is_valid() block
-    paginator = Paginator(products, 12)
+            # Full-text match first; facets and the filters below build on it
+            products = match_products(products, query)
+
+    # The base the facets count over: matched, before ranking and filters
+    matched = products
+
+    if query:
+        products = rank_products(products, query)
+        ranked = True
+    if filters.get('category'):
+        products = products.filter(category=filters['category'])
+    if filters.get('min_price') is not None:
+        products = products.filter(price__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        products = products.filter(price__lte=filters['max_price'])
+    if filters.get('in_stock'):
+        products = products.filter(stock__gt=0)
+
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cursor = request.GET.get('cursor')
+    # Keyset pages: no COUNT(*), no OFFSET, same cost at any depth. Ranked
+    # search results and explicit ?page=N links keep page numbers.
+    is_cursor_page = bool(cursor) or not (page_number or ranked)
+
+    # Filters to carry over into pagination links
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    stock_params = params.copy()
+    stock_params['in_stock'] = 'on'
+
+    # Facets and the page of products are only worked out when the template
+    # calls for them, i.e. when a {% cache %} fragment using them misses:
+    # with the fragments cached, the page runs no catalog query at all.
+    @functools.cache
+    def facets():
+        result = get_facets(matched, filter_key(category_slug, query, **filters), **filters)
+        # Facet links swap in their own filter and keep the rest
+        for bucket in result['price_buckets']:
+            bucket_params = params.copy()
+            bucket_params['min_price'] = bucket['min'] if bucket['min'] is not None else ''
+            bucket_params['max_price'] = bucket['max'] - PRICE_STEP if bucket['max'] is not None else ''
+            bucket['query'] = bucket_params.urlencode()
+        return result
+
+    def category_nav():
+        for cat in categories:
+            cat.product_count = facets()['categories'].get(cat.pk, 0)
+        return categories
+
+    @functools.cache
+    def listing():
+        """(page, cursor continuing past the numbered pages, whether anything lies past them)."""
+        if cursor and ranked:
+            # Ranked results beyond the numbered pages
+            return OffsetCursorPaginator(products, PRODUCTS_PER_PAGE).page(cursor), None, False
+        if is_cursor_page:
+            return CursorPaginator(products, PRODUCTS_PER_PAGE).page(cursor), None, False
+        # Numbered pages are capped so the count and offset never walk the
+        # whole catalog
+        limit = PRODUCTS_PER_PAGE * MAX_NUMBERED_PAGES
+        paginator = Paginator(products[:limit], PRODUCTS_PER_PAGE)
+        page_obj = paginator.get_page(page_number)
+        # The count stops at the cap: "120+" when anything lies past it
+        more_results = paginator.count == limit and products[limit:limit + 1].exists()
+        continue_cursor = None
+        if more_results and not page_obj.has_next():
+            # Hand over to cursor pages for anything deeper
+            if ranked:
+                continue_cursor = encode_offset_cursor(limit)
+            else:
+                last = page_obj[-1]
+                continue_cursor = encode_cursor(last.created_at, last.pk, 'next')
+        return page_obj, continue_cursor, more_results
 
     context = {
         'category': category,
         'categories': categories,
-        'page_obj': page_obj,
+        'category_nav': category_nav,
+        'page_obj': lambda: listing()[0],
+        'continue_cursor': lambda: listing()[1],
+        'more_results': lambda: listing()[2],
+        'is_cursor_page': is_cursor_page,
+        'ranked': ranked,
+        'filter_query': params.urlencode(),
         'search_form': search_form,
+        'facets': facets,
+        'in_stock_query': stock_params.urlencode(),
+        **fragment_context(request),
     }
     return render(request, 'products/product_list.html', context)
 
 
+def _detail_etag(request, pk, slug=None):
+    # Cached reads: the view's own lookups will hit the same entries
+    product = get_product(pk)
+    if product is None:
+        return None
+    related = [p.pk for p in get_related_products(product)]
+    return page_etag(request, 'detail', pk, product.updated_at.isoformat(), related)
+
+
+def _detail_last_modified(request, pk, slug=None):
+    product = get_product(pk)
+    return product.updated_at if product else None
+
+
+@conditional_page(_detail_etag, _detail_last_modified)
 def product_detail(request, pk, slug=None):
-    product = get_object_or_404(
-        Product,
-        pk=pk,
-        available=True,
-    )
-    # Optional: Add related products from same category
-    related_products = Product.objects.filter(
-        category=product.category,
-        available=True
-    ).exclude(pk=pk)[:4]
+    product = get_product(pk)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    related_products = get_related_products(product)
 
     context = {
         'product': product,
@@ -83,13 +205,46 @@ def product_detail(request, pk, slug=None):
     }
     return render(request, 'products/product_detail.html', context)
 
+
+async def _adetail_etag(request, pk, slug=None):
+    product = await aget_product(pk)
+    if product is None:
+        return None
+    related = [p.pk for p in await aget_related_products(product)]
+    return page_etag(request, 'detail', pk, product.updated_at.isoformat(), related)
+
+
+async def _adetail_last_modified(request, pk, slug=None):
+    product = await aget_product(pk)
+    return product.updated_at if product else None
+
+
+@conditional_page(_adetail_etag, _adetail_last_modified)
+async def product_detail_async(request, pk, slug=None):
+    product = await aget_product(pk)
+    if product is None:
+        raise Http404("No Product matches the given query.")
+    related_products = await aget_related_products(product)
+
+    context = {
+        'product': product,
+        'related_products': related_products,
+    }
+    return await arender(request, 'products/product_detail.html', context)
+
+@cache_anonymous_page()
 def home(request):
-    featured_products = Product.objects.filter(is_featured=True, available=True)[:8]
+    featured_products = get_featured_products()
     return render(request, "home.html", {
         "featured_products": featured_products,
+        **fragment_context(request),
     })
 
 
-
-
-
+@cache_anonymous_page()
+async def home_async(request):
+    featured_products = await aget_featured_products()
+    return await arender(request, "home.html", {
+        "featured_products": featured_products,
+        **await afragment_context(request),
+    })
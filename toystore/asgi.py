@@ -1,6 +1,32 @@
+"""
+ASGI entry point. It serves the async home, product list and product detail
+views (``ASYNC_VIEWS``) instead of the sync ones that ``toystore.wsgi`` serves.
+
+    gunicorn toystore.asgi:application -k uvicorn_worker.UvicornWorker --workers 4
+    uvicorn toystore.asgi:application --workers 4 --host 0.0.0.0 --port 8000
+
+A sync gunicorn worker serves one request at a time, and a request waiting
+on the database or the cache holds it. An ASGI worker keeps many requests
+open on its event loop: page cache hits, 304s and catalog cache reads of
+the async views are answered there. Everything sync (the other views, ORM
+queries, sessions, template rendering) runs in a thread of its own request.
+
+That thread is not free: Django's middleware alone moves each request in
+and out of it about fifteen times. With SQLite and the two-tier cache on
+the same box, queries and cache reads are faster than that, and sync
+workers serve more requests per second. ASGI pays off when the database
+or cache is across a network. ``manage.py bench_servers`` puts the same
+load on both; run it on the target setup before switching.
+
+Those threads end with their request, so persistent database connections
+are off (``DB_CONN_MAX_AGE=0``): a kept connection would never be reused.
+On PostgreSQL, pool connections with PgBouncer instead.
+"""
 import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'toystore.settings')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
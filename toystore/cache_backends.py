@@ -0,0 +1,323 @@
+"""
+Two-tier cache backend: a small in-process LRU (L1) in front of a shared
+SQLite file (L2) that every worker on the box can see.
+
+Every L2 row carries a ``stamp`` that changes on each write. L1 trusts its
+copy for ``L1_TIMEOUT`` seconds, then revalidates it with an indexed stamp
+lookup (no value transfer, no unpickling). A write in one worker therefore
+reaches the other workers' L1 within ``L1_TIMEOUT`` seconds, and
+immediately in the writing worker.
+
+Keys listed in ``L1_ALWAYS_REVALIDATE`` get no such window: every read
+checks the stamp, so a change is seen by all workers at once. This is
+meant for the version counters that retire whole namespaces (cached
+pages, facets), where a few stale seconds would mean serving every
+retired entry.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'toystore.cache_backends.TwoTierCache',
+            'LOCATION': BASE_DIR / 'cache' / 'cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 20000, 'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5,
+                        'L1_ALWAYS_REVALIDATE': ['pages:version']},
+        }
+    }
+
+Hit/miss counters are kept per tier; ``stats()`` returns this process's
+numbers and ``shared_stats()`` sums the ones every worker has flushed to L2
+(see the ``cache_stats`` management command). Each lookup is also counted
+against the current request for ``toystore.instrumentation``.
+
+In async code, ``aget`` answers fresh L1 hits on the event loop. Everything
+that reaches SQLite runs in the loop's thread pool, not the request's ORM
+thread: the connections are per thread anyway.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from toystore.instrumentation import record_cache_lookup
+
+STATS_FLUSH_INTERVAL = 30
+# Rows of workers that stopped reporting (restarts, scale-down) age out
+STATS_RETENTION = 60 * 60 * 24
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cache_entry ("
+    " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, stamp TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)",
+    "CREATE TABLE IF NOT EXISTS cache_stats ("
+    " worker TEXT PRIMARY KEY, l1_hits INTEGER, l1_misses INTEGER,"
+    " l2_hits INTEGER, l2_misses INTEGER, updated REAL)",
+)
+
+STAT_FIELDS = ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses')
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._always_revalidate = frozenset(self.make_key(key) for key in options.get('L1_ALWAYS_REVALIDATE', ()))
+        self._l1 = OrderedDict()
+        self._l1_lock = threading.Lock()
+        self._local = threading.local()
+        self._worker = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._stats = dict.fromkeys(STAT_FIELDS, 0)
+        self._stats_flushed = time.monotonic()
+        self._writes = 0
+
+    # -- L2 connection -----------------------------------------------------
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections must not cross a fork (gunicorn preload)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    # -- L1 helpers --------------------------------------------------------
+
+    def _l1_get(self, key):
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is not None:
+                self._l1.move_to_end(key)
+            return entry
+
+    def _l1_set(self, key, pickled, expires, stamp):
+        checked_until = 0 if key in self._always_revalidate else time.time() + self._l1_timeout
+        with self._l1_lock:
+            self._l1[key] = (pickled, expires, stamp, checked_until)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    def _count(self, field):
+        self._stats[field] += 1
+        # An L1 miss falls through to L2, which decides the lookup
+        if field != 'l1_misses':
+            record_cache_lookup(hit=field.endswith('hits'))
+        if time.monotonic() - self._stats_flushed > STATS_FLUSH_INTERVAL:
+            self._flush_stats()
+
+    def _flush_stats(self):
+        self._stats_flushed = time.monotonic()
+        try:
+            self._db().execute(
+                "INSERT OR REPLACE INTO cache_stats VALUES (?, ?, ?, ?, ?, ?)",
+                (self._worker, *(self._stats[f] for f in STAT_FIELDS), time.time()),
+            )
+        except sqlite3.Error:
+            pass
+
+    # -- BaseCache API -----------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        entry = self._l1_get(key)
+        if entry is not None:
+            pickled, expires, stamp, checked_until = entry
+            if expires is not None and expires <= now:
+                self._l1_delete(key)
+            elif checked_until > now:
+                self._count('l1_hits')
+                return pickle.loads(pickled)
+            else:
+                row = self._db().execute(
+                    "SELECT stamp FROM cache_entry WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[0] == stamp:
+                    self._l1_set(key, pickled, expires, stamp)
+                    self._count('l1_hits')
+                    return pickle.loads(pickled)
+                self._l1_delete(key)
+        self._count('l1_misses')
+
+        row = self._db().execute(
+            "SELECT value, expires, stamp FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            self._count('l2_misses')
+            return default
+        self._count('l2_hits')
+        pickled, expires, stamp = row
+        self._l1_set(key, pickled, expires, stamp)
+        return pickle.loads(pickled)
+
+    async def aget(self, key, default=None, version=None):
+        entry = self._l1_get(self.make_and_validate_key(key, version=version))
+        if entry is not None:
+            pickled, expires, stamp, checked_until = entry
+            now = time.time()
+            if checked_until > now and (expires is None or expires > now):
+                self._count('l1_hits')
+                return pickle.loads(pickled)
+        return await sync_to_async(self.get, thread_sensitive=False)(key, default, version)
+
+    async def aset(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.set, thread_sensitive=False)(key, value, timeout, version)
+
+    async def aadd(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return await sync_to_async(self.add, thread_sensitive=False)(key, value, timeout, version)
+
+    async def adelete(self, key, version=None):
+        return await sync_to_async(self.delete, thread_sensitive=False)(key, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(key, value, timeout, "INSERT OR REPLACE INTO cache_entry VALUES (?, ?, ?, ?)")
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        # Only replaces a row that has already expired, atomically in SQLite
+        return self._write(
+            key, value, timeout,
+            "INSERT INTO cache_entry VALUES (?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "value = excluded.value, expires = excluded.expires, stamp = excluded.stamp "
+            "WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?",
+            extra=(time.time(),),
+        )
+
+    def _write(self, key, value, timeout, sql, extra=()):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        stamp = uuid.uuid4().hex
+        cursor = self._db().execute(sql, (key, pickled, expires, stamp, *extra))
+        written = cursor.rowcount > 0
+        if written:
+            self._l1_set(key, pickled, expires, stamp)
+            self._maybe_cull()
+        return written
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        cursor = self._db().execute(
+            "UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (expires, key, time.time()),
+        )
+        self._l1_delete(key)
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(key)
+        cursor = self._db().execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        for key in keys:
+            self._l1_delete(key)
+        self._db().executemany("DELETE FROM cache_entry WHERE key = ?", [(key,) for key in keys])
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._db().execute(
+            "SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._db()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            stamp = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE cache_entry SET value = ?, stamp = ? WHERE key = ?", (pickled, stamp, key)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._l1_delete(key)
+        return value
+
+    def clear(self):
+        with self._l1_lock:
+            self._l1.clear()
+        self._db().execute("DELETE FROM cache_entry")
+
+    def close(self, **kwargs):
+        # Keep the per-thread connection; Django calls this after every request
+        pass
+
+    # -- culling and stats -------------------------------------------------
+
+    def _maybe_cull(self):
+        self._writes += 1
+        if self._writes % 100:
+            return
+        conn = self._db()
+        conn.execute("DELETE FROM cache_entry WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+        count = conn.execute("SELECT COUNT(*) FROM cache_entry").fetchone()[0]
+        if count > self._max_entries:
+            # Drop the entries closest to expiry, 1/CULL_FREQUENCY of the table
+            conn.execute(
+                "DELETE FROM cache_entry WHERE key IN (SELECT key FROM cache_entry "
+                "ORDER BY expires IS NULL, expires LIMIT ?)",
+                (count // self._cull_frequency,),
+            )
+
+    def stats(self):
+        """Hit/miss counters and hit rates for this process."""
+        return _with_rates(dict(self._stats))
+
+    def shared_stats(self):
+        """Counters summed over every worker that has flushed them to L2 today."""
+        if any(self._stats.values()):
+            self._flush_stats()
+        conn = self._db()
+        conn.execute("DELETE FROM cache_stats WHERE updated < ?", (time.time() - STATS_RETENTION,))
+        row = conn.execute(
+            "SELECT SUM(l1_hits), SUM(l1_misses), SUM(l2_hits), SUM(l2_misses), COUNT(*) "
+            "FROM cache_stats"
+        ).fetchone()
+        stats = dict(zip(STAT_FIELDS, (value or 0 for value in row[:4])))
+        stats['workers'] = row[4]
+        return _with_rates(stats)
+
+
+def _with_rates(stats):
+    for tier in ('l1', 'l2'):
+        lookups = stats[f'{tier}_hits'] + stats[f'{tier}_misses']
+        stats[f'{tier}_hit_rate'] = stats[f'{tier}_hits'] / lookups if lookups else 0.0
+    return stats
@@ -0,0 +1,96 @@
+"""
+SQLite backend for several gunicorn workers sharing one database file.
+
+On top of Django's backend it:
+
+* runs the PRAGMAs in ``OPTIONS['pragmas']`` on every new connection
+  (WAL, synchronous, busy_timeout, cache and mmap sizes, ...);
+* opens transactions with ``BEGIN <OPTIONS['transaction_mode']>``.
+  IMMEDIATE takes the write lock up front, where busy_timeout can wait for
+  it, instead of failing mid-transaction when a read lock cannot be upgraded;
+* retries statements that fail with "database is locked" outside a
+  transaction (including the BEGIN itself), up to ``OPTIONS['lock_retries']``
+  times with jittered exponential backoff. Inside a transaction the error is
+  raised as usual: the statement cannot be replayed on its own.
+
+    'ENGINE': 'toystore.db.sqlite3',
+    'OPTIONS': {
+        'timeout': 5,
+        'transaction_mode': 'IMMEDIATE',
+        'lock_retries': 5,
+        'pragmas': {'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+    }
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+from django.db.backends.sqlite3.base import Database
+
+CUSTOM_OPTIONS = ('pragmas', 'transaction_mode', 'lock_retries')
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 1.0
+
+
+def _is_lock_error(exc):
+    return isinstance(exc, Database.OperationalError) and 'database is locked' in str(exc)
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    lock_retries = 0
+
+    def execute(self, query, params=None):
+        return self._retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        if self.lock_retries:
+            # Replaying needs the parameters again
+            param_list = list(param_list)
+        return self._retry(super().executemany, query, param_list)
+
+    def _retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(*args)
+            except Database.OperationalError as exc:
+                if attempt >= self.lock_retries or not _is_lock_error(exc) or self.connection.in_transaction:
+                    raise
+                delay = min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                attempt += 1
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, *args, **kwargs):
+        super().__init__(settings_dict, *args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = dict(options.get('pragmas', {}))
+        self.transaction_mode = (options.get('transaction_mode') or '').upper()
+        if self.transaction_mode and self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(f"transaction_mode must be one of {TRANSACTION_MODES}")
+        self.lock_retries = int(options.get('lock_retries', 0))
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in CUSTOM_OPTIONS:
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.lock_retries = self.lock_retries
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f"BEGIN {self.transaction_mode}")
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,309 @@
+"""
+Per-request instrumentation, cheap enough to leave on in production.
+
+``RequestMetricsMiddleware`` records for each request:
+
+* the queries run on every database connection, the time spent in them and
+  how many repeat an earlier query of the same request exactly (an N+1 or
+  a missing ``select_related`` usually shows up here first);
+* two-tier cache hits and misses (``toystore.cache_backends`` reports them);
+* the time spent rendering templates, when ``TEMPLATES`` uses the
+  ``DjangoTemplates`` backend below.
+
+They go back to the browser in a ``Server-Timing`` header (shown by the
+network panel of the dev tools) and into in-process Prometheus histograms,
+served by ``metrics_view`` to staff users or to a scraper presenting
+``METRICS_TOKEN``. Each gunicorn worker keeps its own histograms, so a
+scrape sees the worker that answered it; the two-tier cache counters are
+the exception, summed over every worker.
+
+A view that runs more queries than its ``QUERY_BUDGETS`` entry (default
+``DEFAULT_QUERY_BUDGET``) logs a warning on the ``toystore.instrumentation``
+logger.
+
+Under ASGI the middleware runs async, and each request's ORM work happens
+in a thread and on a connection of its own. Those connections are watched
+from the moment they open (``connection_created``), so timing a request
+costs no extra trip to its thread.
+"""
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'sql_time', 'duplicates', 'seen',
+                 'cache_hits', 'cache_misses', 'template_time', 'template_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = self.duplicates = self.cache_hits = self.cache_misses = 0
+        self.sql_time = self.template_time = 0.0
+        self.template_depth = 0
+        self.seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        """``execute_wrapper`` hook: time the query and spot exact repeats."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            key = (sql, repr(params))
+            if key in self.seen:
+                self.duplicates += 1
+            else:
+                self.seen.add(key)
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries, {self.duplicates} duplicates"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def record_cache_lookup(hit):
+    """Count a cache lookup against the current request, if there is one."""
+    metrics = _current.get()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; made cumulative when exported
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class ViewStats:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.statuses = {}
+        self.sql_seconds = self.template_seconds = 0.0
+        self.duplicates = self.cache_hits = self.cache_misses = self.over_budget = 0
+
+
+class Registry:
+    """Aggregated request metrics per view name, for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    def observe(self, view, status, total, metrics, over_budget):
+        status_class = f'{status // 100}xx'
+        with self._lock:
+            stats = self.views.get(view)
+            if stats is None:
+                stats = self.views[view] = ViewStats()
+            stats.duration.observe(total)
+            stats.queries.observe(metrics.queries)
+            stats.statuses[status_class] = stats.statuses.get(status_class, 0) + 1
+            stats.sql_seconds += metrics.sql_time
+            stats.template_seconds += metrics.template_time
+            stats.duplicates += metrics.duplicates
+            stats.cache_hits += metrics.cache_hits
+            stats.cache_misses += metrics.cache_misses
+            stats.over_budget += over_budget
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.extend((f'# HELP {name} {help_text}', f'# TYPE {name} {kind}'))
+
+        def histogram(name, help_text, attribute):
+            family(name, 'histogram', help_text)
+            for view, stats in views:
+                hist = getattr(stats, attribute)
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{view="{view}"}} {hist.sum}')
+                lines.append(f'{name}_count{{view="{view}"}} {cumulative}')
+
+        def counter(name, help_text, values):
+            family(name, 'counter', help_text)
+            lines.extend(f'{name}{{{labels}}} {value}' for labels, value in values)
+
+        with self._lock:
+            views = [(_label(view), stats) for view, stats in sorted(self.views.items())]
+            histogram('toystore_request_duration_seconds', 'Time to build the response.', 'duration')
+            histogram('toystore_request_queries', 'SQL queries per request.', 'queries')
+            counter('toystore_requests_total', 'Responses by status class.', [
+                (f'view="{view}",status="{status}"', count)
+                for view, stats in views for status, count in sorted(stats.statuses.items())
+            ])
+            counter('toystore_db_seconds_total', 'Time spent in SQL.',
+                    [(f'view="{view}"', stats.sql_seconds) for view, stats in views])
+            counter('toystore_db_duplicate_queries_total', 'Queries repeating one earlier in the request.',
+                    [(f'view="{view}"', stats.duplicates) for view, stats in views])
+            counter('toystore_template_seconds_total', 'Time spent rendering templates.',
+                    [(f'view="{view}"', stats.template_seconds) for view, stats in views])
+            counter('toystore_cache_lookups_total', 'Cache lookups during requests.', [
+                (f'view="{view}",result="{result}"', getattr(stats, f'cache_{result}'))
+                for view, stats in views for result in ('hits', 'misses')
+            ])
+            counter('toystore_query_budget_exceeded_total', 'Requests over their query budget.',
+                    [(f'view="{view}"', stats.over_budget) for view, stats in views])
+
+        tier_stats = getattr(caches['default'], 'shared_stats', None)
+        if tier_stats is not None:
+            stats = tier_stats()
+            counter('toystore_cache_tier_lookups_total', 'Two-tier cache lookups, all workers.', [
+                (f'tier="{tier}",result="{result}"', stats[f'{tier}_{result}'])
+                for tier in ('l1', 'l2') for result in ('hits', 'misses')
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _count_query(execute, sql, params, many, context):
+    """``execute_wrapper`` kept on every connection of an async process."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def _watch_connection(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            connection_created.connect(_watch_connection, dispatch_uid='toystore.instrumentation')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._record(request, response, metrics)
+
+    def _record(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(view, getattr(settings, 'DEFAULT_QUERY_BUDGET', None))
+        over_budget = budget is not None and metrics.queries > budget
+        if over_budget:
+            logger.warning(
+                "%s ran %d queries (%d duplicates), over its budget of %d: %s",
+                view, metrics.queries, metrics.duplicates, budget, request.get_full_path(),
+            )
+        registry.observe(view, response.status_code, total, metrics, over_budget)
+        if getattr(settings, 'SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing(total)
+        return response
+
+
+class Template:
+    """A backend template that adds its render time to the current request."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return self.template.render(context, request)
+        # Templates rendered from within a template are already being timed
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Django's template backend, timing every render for the request metrics."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name))
+
+
+def metrics_view(request):
+    """Prometheus metrics for staff users, or a scraper sending ``Authorization: Bearer <METRICS_TOKEN>``."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed and token:
+        allowed = hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -4,6 +4,8 @@ from decimal import Decimal
 from pathlib import Path
 from dotenv import load_dotenv
 
+from toystore.db import database_config
+
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,7 +33,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise that also runs async, so ASGI requests never enter a thread here
+    'toystore.middleware.WhiteNoiseMiddleware',
+    # Outermost after static files: sees the session and auth queries too
+    'toystore.instrumentation.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -44,7 +49,8 @@ ROOT_URLCONF = 'toystore.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend, timing renders for the request metrics
+        'BACKEND': 'toystore.instrumentation.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -53,6 +59,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # Placeholder CSRF token in pages rendered for the page cache
+                'products.page_cache.csrf',
             ],
         },
     },
@@ -60,11 +68,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'toystore.wsgi.application'
 
+# Async home, product list and product detail views instead of the sync
+# ones; toystore/asgi.py turns this on (see there for running under uvicorn)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+# SQLite in WAL mode by default; DATABASE_URL switches to PostgreSQL
+# (see toystore/db/__init__.py for the other DB_*/SQLITE_* variables)
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
 
@@ -74,10 +85,21 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# In-process LRU in front of a shared SQLite file (see toystore/cache_backends.py).
+# L1_TIMEOUT bounds how long another worker's write can go unseen, except for
+# the L1_ALWAYS_REVALIDATE keys: the page and facet version counters
+# (products.page_cache, products.facets), which every worker sees at once.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': BASE_DIR / 'cache',
+        'BACKEND': 'toystore.cache_backends.TwoTierCache',
+        'LOCATION': BASE_DIR / 'cache' / 'cache.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 20000)),
+            'L1_MAX_ENTRIES': int(os.getenv('CACHE_L1_MAX_ENTRIES', 1000)),
+            'L1_TIMEOUT': float(os.getenv('CACHE_L1_TIMEOUT', 5)),
+            'L1_ALWAYS_REVALIDATE': ['pages:version', 'facets:version'],
+        },
     }
 }
 
@@ -97,18 +119,68 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Cart storage: 'cart.backends.DatabaseCartBackend' (one row per line) or
+# 'cart.backends.SessionCartBackend' (JSON in the session)
+CART_BACKEND = os.getenv('CART_BACKEND', 'cart.backends.DatabaseCartBackend')
+
+# How long checkout holds a cart's stock for the shopper (run expire_holds from cron)
+STOCK_HOLD_MINUTES = int(os.getenv('STOCK_HOLD_MINUTES', '15'))
+
 #cart tax added
+# Component rates per GST slab (Product.gst_rate). Intra-state sales pay
+# Central + State GST, inter-state sales pay Integrated GST.
 INDIAN_TAX_RATES = {
     'GST': {
-        'cgst': Decimal('0.09'),  # 9% Central GST
-        'sgst': Decimal('0.09'),  # 9% State GST
-        'igst': Decimal('0.18'),  # 18% Integrated GST (for inter-state)
+        5: {'cgst': Decimal('0.025'), 'sgst': Decimal('0.025'), 'igst': Decimal('0.05')},
+        12: {'cgst': Decimal('0.06'), 'sgst': Decimal('0.06'), 'igst': Decimal('0.12')},
+        18: {'cgst': Decimal('0.09'), 'sgst': Decimal('0.09'), 'igst': Decimal('0.18')},
+        28: {'cgst': Decimal('0.14'), 'sgst': Decimal('0.14'), 'igst': Decimal('0.28')},
     },
-    # You can add more tax slabs (5%, 12%, 28% etc.)
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Request instrumentation (toystore/instrumentation.py): Server-Timing
+# headers, /metrics/ for staff or `Authorization: Bearer $METRICS_TOKEN`,
+# and a warning for views running more queries than their budget
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+DEFAULT_QUERY_BUDGET = int(os.getenv('DEFAULT_QUERY_BUDGET', 50))
+QUERY_BUDGETS = {
+    'home': 5,
+    'products:list': 8,
+    'products:search': 8,
+    'products:by_category': 8,
+    'products:detail': 8,
+    'products:detail_with_slug': 8,
+    'products:api_categories': 2,
+    'products:api_products': 6,
+    'products:api_product': 2,
+    'cart:cart_detail': 10,
+    'cart:add': 10,
+    'cart:remove_from_cart': 10,
+    'orders:checkout': 25,
+    'orders:history': 6,
+    'orders:items': 6,
+}
+
+# Outgoing mail (the newsletter): SMTP by default. For trying it out, set
+# EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend (writes
+# to EMAIL_FILE_PATH) or ...locmem.EmailBackend
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+EMAIL_TIMEOUT = 30
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Pushtoys <newsletter@pushtoys.onrender.com>')
+# Absolute links in emails
+SITE_URL = os.getenv('SITE_URL', 'https://pushtoys.onrender.com')
+# send_newsletter's default pace, in messages per second (0: no limit)
+NEWSLETTER_SEND_RATE = float(os.getenv('NEWSLETTER_SEND_RATE', '10'))
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from products.views import home
+from products.views import home, home_async
+from toystore.instrumentation import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,7 +11,8 @@ urlpatterns = [
     path('products/', include('products.urls')),
     path('cart/', include('cart.urls', namespace='cart')),
     path('orders/', include('orders.urls')),
-    path('', home, name='home'),  # Home page
+    path('metrics/', metrics_view, name='metrics'),
+    path('', home_async if settings.ASYNC_VIEWS else home, name='home'),  # Home page
 ]
 
 